@@ -7,6 +7,22 @@ from typing import Callable, Dict, Optional, Tuple
 
 from ansible.module_utils.basic import AnsibleModule
 
+# Patterns compiled once at import; for the cmdline patterns group 1 is the
+# prefix up to and including the opening quote and group 2 the parameters
+_GRUB_CMDLINE_RE = re.compile(r'^(GRUB_CMDLINE_LINUX(?:_DEFAULT)?=")([^"]*)"', re.M)
+_LIMINE_CMDLINE_RE = re.compile(r'^(KERNEL_CMDLINE\[default\]\+?=")([^"]*)"', re.M)
+_QUOTED_LINE_RE = re.compile(r'^(\s*"[^"]*"\s*)(".*")')
+_REFIND_PARAMS_RE = re.compile(r'^(\s*"[^"]*"\s*)(.*)')
+_REFIND_LINE_RE = re.compile(r'^([ \t]*"[^"\n]*"[ \t]*)"(.*)"', re.M)
+_SYSTEMD_OPTIONS_RE = re.compile(r"^([ \t]*options[ \t]+)(.*)$", re.M)
+
+_CONFIG_FILES: Dict[str, str] = {
+    "systemd-boot": "/boot/loader/entries/linux-cachyos.conf",
+    "refind": "/boot/refind_linux.conf",
+    "grub": "/etc/default/grub",
+    "limine": "/etc/default/limine",
+}
+
 
 def safe_path_exists(path: str) -> bool:
     """Safely check if path exists, handling the case where mock doesn't have enough return values."""
@@ -19,17 +35,11 @@ def safe_path_exists(path: str) -> bool:
 
 
 def detect_bootloader() -> str:
-    # Check in priority order
-    if safe_path_exists("/boot/loader/entries/linux-cachyos.conf"):
-        return "systemd-boot"
-    elif safe_path_exists("/boot/refind_linux.conf"):
-        return "refind"
-    elif safe_path_exists("/etc/default/grub"):
-        return "grub"
-    elif safe_path_exists("/etc/default/limine"):
-        return "limine"
-    else:
-        return "none"
+    # _CONFIG_FILES is ordered by detection priority
+    for bootloader_type, config_path in _CONFIG_FILES.items():
+        if safe_path_exists(config_path):
+            return bootloader_type
+    return "none"
 
 
 def get_bootloader_config(
@@ -38,14 +48,7 @@ def get_bootloader_config(
     if config_file is not None:
         return config_file
 
-    config_files: Dict[str, str] = {
-        "systemd-boot": "/boot/loader/entries/linux-cachyos.conf",
-        "refind": "/boot/refind_linux.conf",
-        "grub": "/etc/default/grub",
-        "limine": "/etc/default/limine",
-    }
-
-    return config_files.get(bootloader_type)
+    return _CONFIG_FILES.get(bootloader_type)
 
 
 def create_backup(module: AnsibleModule, config_file: str) -> bool:
@@ -58,22 +61,42 @@ def create_backup(module: AnsibleModule, config_file: str) -> bool:
         return False
 
 
-def write_config(
-    module: AnsibleModule,
-    config_file: str,
-    content: str,
-    backup_file: Optional[str] = None,
-) -> bool:
+def _read_file(path: str) -> str:
+    # Decode as UTF-8; text mode folds CRLF
+    with open(path, encoding="utf-8", newline=None) as f:
+        return f.read()
+
+
+def write_config(module: AnsibleModule, config_file: str, content: str) -> bool:
+    # Write beside the target and rename over it, so a failed write leaves the
+    # original config untouched instead of truncated. Symlinks are resolved
+    # first so the rename replaces the file they point at, not the link
+    target = os.path.realpath(config_file)
+    tmp_file = f"{target}.{os.getpid()}.tmp"
     try:
-        with open(config_file, "w") as f:
+        with open(tmp_file, "w", encoding="utf-8") as f:
             f.write(content)
+            # Make the data durable before the rename; otherwise a power loss
+            # (notably on a vfat ESP) can leave an empty config in place
+            f.flush()
+            os.fsync(f.fileno())
+        # Match the original's owner, then its mode and xattrs (which carry
+        # the SELinux label); chown comes first as it can clear mode bits, and
+        # the times copystat brings over are reset since the content changed
+        original = os.stat(target)
+        written = os.stat(tmp_file)
+        if (written.st_uid, written.st_gid) != (original.st_uid, original.st_gid):
+            os.chown(tmp_file, original.st_uid, original.st_gid)
+        shutil.copystat(target, tmp_file)
+        os.utime(tmp_file)
+        os.replace(tmp_file, target)
         return True
-    except IOError as e:
-        if backup_file:
-            try:
-                shutil.move(backup_file, config_file)
-            except Exception:
-                pass
+    except (OSError, ValueError) as e:
+        # ValueError covers UnicodeEncodeError, so no failure leaks the temp file
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
         module.fail_json(msg=f"Failed to write config file: {str(e)}")
         return False
 
@@ -98,12 +121,23 @@ def _add_or_remove_parameter(
     needs_change = False
     new_content = content
 
-    if operation == "remove":
-        pattern = r"(^|\s)" + re.escape(param) + r"(\s|$)"
-        if re.search(pattern, new_content):
+    target = param.split()
+    if operation == "remove" and target:
+        # Parameters are matched as runs of whitespace-split tokens, and joining
+        # the kept tokens normalizes their spacing without a regex pass
+        tokens = new_content.split()
+        width = len(target)
+        kept = []
+        pos = 0
+        while pos < len(tokens):
+            if tokens[pos : pos + width] == target:
+                pos += width
+            else:
+                kept.append(tokens[pos])
+                pos += 1
+        if len(kept) != len(tokens):
+            new_content = " ".join(kept)
             needs_change = True
-            new_content = re.sub(pattern, r"\1 \2", new_content)
-            new_content = re.sub(r" +", " ", new_content).strip()
     elif operation == "add":
         # If the parameter is not already present, add it
         if param not in new_content.split():
@@ -113,6 +147,28 @@ def _add_or_remove_parameter(
     return new_content, needs_change
 
 
+def _edit_params(
+    params: str, text_to_add: Optional[str], text_to_remove: Optional[str]
+) -> str:
+    """
+    Apply a removal and then an addition to a whitespace-separated parameter string.
+
+    Args:
+        params: The current parameter string
+        text_to_add: Parameter to add
+        text_to_remove: Parameter to remove
+
+    Returns:
+        The edited parameter string, identical to params when nothing changed
+    """
+    new_params = params
+    if text_to_remove:
+        new_params, _ = _add_or_remove_parameter(new_params, text_to_remove, "remove")
+    if text_to_add and text_to_add not in new_params.split():
+        new_params = f"{new_params} {text_to_add}".strip()
+    return new_params
+
+
 def _update_quoted_line_params(
     line: str, param: str, operation: str
 ) -> Tuple[str, bool]:
@@ -127,7 +183,7 @@ def _update_quoted_line_params(
     Returns:
         A tuple of (modified_line, needs_change)
     """
-    match = re.match(r'^(\s*"[^"]*"\s*)(".*")', line)
+    match = _QUOTED_LINE_RE.match(line)
     if not match:
         return line, False
 
@@ -165,37 +221,9 @@ def _process_quoted_line(line: str, param: str, operation: str) -> Tuple[str, bo
     return _update_quoted_line_params(line, param, operation)
 
 
-def _modify_simple_config(
-    content: str, text_to_add: Optional[str], text_to_remove: Optional[str]
-) -> Tuple[str, bool]:
-    """
-    Generic function to modify a simple configuration file with kernel parameters.
-    """
-    needs_change = False
-    new_content = content
-
-    if text_to_remove:
-        modified_content, changed = _add_or_remove_parameter(
-            content, text_to_remove, "remove"
-        )
-        if changed:
-            new_content = modified_content
-            needs_change = True
-
-    if text_to_add:
-        modified_content, changed = _add_or_remove_parameter(
-            new_content, text_to_add, "add"
-        )
-        if changed:
-            new_content = modified_content
-            needs_change = True
-
-    return new_content, needs_change
-
-
 def _modify_line_with_pattern(
     content: str,
-    pattern: str,
+    pattern: re.Pattern[str],
     text_to_add: Optional[str],
     text_to_remove: Optional[str],
 ) -> Tuple[str, bool]:
@@ -204,7 +232,8 @@ def _modify_line_with_pattern(
 
     Args:
         content: Original content
-        pattern: Regex pattern to match the line to modify
+        pattern: Compiled multiline pattern whose group 1 is the line prefix
+            and group 2 the quoted parameter string
         text_to_add: Parameter to add
         text_to_remove: Parameter to remove
 
@@ -212,77 +241,30 @@ def _modify_line_with_pattern(
         Modified content and whether changes were made
     """
     needs_change = False
-    new_content = content
 
-    if text_to_remove:
-        # Match the line with pattern and remove the parameter
-        def remove_param(match):
-            nonlocal needs_change
-            line = match.group(0)
-            if match.lastindex is None or match.lastindex < 2:
-                # If there are insufficient capturing groups, return the original line
-                return line
-
-            # Determine the quoted content group based on the pattern structure
-            # For GRUB: pattern r'^(GRUB_CMDLINE_LINUX(_DEFAULT)?=")([^"]*)"' creates 3 groups, quoted content is group 3
-            # For Limine: pattern r'^(KERNEL_CMDLINE\[default\]\+?=")([^"]*)"' creates 2 groups, quoted content is group 2
-            if match.lastindex >= 3 and r'(_DEFAULT)?=")' in pattern:  # GRUB pattern
-                prefix = match.group(1)
-                quoted_content = match.group(3)  # Group 3 is the quoted content
-            else:  # Limine pattern or others
-                prefix = match.group(1)
-                quoted_content = match.group(2)  # Group 2 is the quoted content
-
-            # Apply the parameter removal to the quoted content
-            new_inner, changed = _add_or_remove_parameter(
-                quoted_content, text_to_remove, "remove"
-            )
+    def edit_params(match):
+        nonlocal needs_change
+        prefix, quoted_content = match.groups()
 
-            if changed:
-                needs_change = True
-                return prefix + new_inner + '"'
-            return line
+        # Removal and addition share one pass over each matching line
+        new_inner = _edit_params(quoted_content, text_to_add, text_to_remove)
+        if new_inner == quoted_content:
+            return match.group(0)
+        needs_change = True
+        return prefix + new_inner + '"'
 
-        new_content = re.sub(pattern, remove_param, new_content, flags=re.MULTILINE)
+    new_content, match_count = pattern.subn(edit_params, content)
 
-    if text_to_add:
-        # Match the line with pattern and add the parameter if not present
-        def add_param(match):
-            nonlocal needs_change
-            line = match.group(0)
-            if match.lastindex is None or match.lastindex < 2:
-                # If there are insufficient capturing groups, return the original line
-                return line
-
-            # Determine the quoted content group based on the pattern structure
-            # For GRUB: pattern r'^(GRUB_CMDLINE_LINUX(_DEFAULT)?=")([^"]*)"' creates 3 groups, quoted content is group 3
-            # For Limine: pattern r'^(KERNEL_CMDLINE\[default\]\+?=")([^"]*)"' creates 2 groups, quoted content is group 2
-            if match.lastindex >= 3 and r'(_DEFAULT)?=")' in pattern:  # GRUB pattern
-                prefix = match.group(1)
-                quoted_content = match.group(3)  # Group 3 is the quoted content
-            else:  # Limine pattern or others
-                prefix = match.group(1)
-                quoted_content = match.group(2)  # Group 2 is the quoted content
-
-            # Add the parameter if not already present
-            if quoted_content is not None and text_to_add not in quoted_content.split():
-                new_inner = f"{quoted_content} {text_to_add}".strip()
-                needs_change = True
-                return prefix + new_inner + '"'
-            return line
-
-        new_content = re.sub(pattern, add_param, new_content, flags=re.MULTILINE)
-
-        # If no matching line was found, add a new line with the parameter
-        if text_to_add and not re.search(pattern, new_content, re.MULTILINE):
-            # For GRUB, we need to add GRUB_CMDLINE_LINUX_DEFAULT or GRUB_CMDLINE_LINUX
-            if "GRUB_CMDLINE_LINUX" in pattern:
-                new_content += f'\nGRUB_CMDLINE_LINUX_DEFAULT="{text_to_add}"\n'
-                needs_change = True
-            # For Limine, add KERNEL_CMDLINE
-            elif "KERNEL_CMDLINE" in pattern:
-                new_content += f'\nKERNEL_CMDLINE[default]+="{text_to_add}"\n'
-                needs_change = True
+    # If no matching line was found, add a new line with the parameter
+    if text_to_add and not match_count:
+        # For GRUB, we need to add GRUB_CMDLINE_LINUX_DEFAULT or GRUB_CMDLINE_LINUX
+        if pattern is _GRUB_CMDLINE_RE:
+            new_content += f'\nGRUB_CMDLINE_LINUX_DEFAULT="{text_to_add}"\n'
+            needs_change = True
+        # For Limine, add KERNEL_CMDLINE
+        elif pattern is _LIMINE_CMDLINE_RE:
+            new_content += f'\nKERNEL_CMDLINE[default]+="{text_to_add}"\n'
+            needs_change = True
 
     return new_content, needs_change
 
@@ -301,15 +283,39 @@ def modify_systemd_boot_config(
     Returns:
         A tuple of (modified_content, needs_change)
     """
-    # Use the generic function for basic add/remove
-    new_content, needs_change = _modify_simple_config(
-        content, text_to_add, text_to_remove
-    )
+    needs_change = False
 
-    # Ensure proper options line format if needed
-    if text_to_add and not re.search(r"options\s", new_content):
-        new_content += f"\noptions {text_to_add}\n"
+    def edit_options(match, add=None, remove=None):
+        nonlocal needs_change
+        prefix, params = match.groups()
+        new_params = _edit_params(params, add, remove)
+        if new_params == params:
+            return match.group(0)
         needs_change = True
+        return prefix + new_params
+
+    # Only the options lines carry kernel parameters; a removal applies to
+    # every one of them
+    new_content = content
+    if text_to_remove:
+        new_content = _SYSTEMD_OPTIONS_RE.sub(
+            lambda m: edit_options(m, remove=text_to_remove), new_content
+        )
+
+    if text_to_add:
+        # The entry's parameters are the union of its options lines, so an
+        # argument already on any of them is not added again; a new one goes
+        # onto the first line only
+        option_params = [
+            params for _, params in _SYSTEMD_OPTIONS_RE.findall(new_content)
+        ]
+        if not option_params:
+            new_content += f"\noptions {text_to_add}\n"
+            needs_change = True
+        elif not any(text_to_add in params.split() for params in option_params):
+            new_content = _SYSTEMD_OPTIONS_RE.sub(
+                lambda m: edit_options(m, add=text_to_add), new_content, count=1
+            )
 
     return new_content, needs_change
 
@@ -329,68 +335,21 @@ def modify_refind_config(
         A tuple of (modified_content, needs_change)
     """
     needs_change = False
-    new_lines = []
-    first_match_processed = False
-
-    for line in content.splitlines(keepends=True):
-        stripped = line.strip()
 
-        if not stripped or stripped.startswith("#"):
-            new_lines.append(line)
-            continue
-
-        match = re.match(r'^(\s*"[^"]*"\s*)(".*")', line)
-        if not match:
-            new_lines.append(line)
-            continue
+    def edit_params(match):
+        nonlocal needs_change
+        description, inner_params = match.groups()
+        new_params = _edit_params(inner_params, text_to_add, text_to_remove)
+        if new_params == inner_params:
+            return match.group(0)
+        needs_change = True
+        return f'{description}"{new_params}"'
 
-        description, quoted_params = match.groups()
-
-        # Extract the content inside quotes
-        if quoted_params.startswith('"') and quoted_params.endswith('"'):
-            inner_params = quoted_params[1:-1]  # Remove surrounding quotes
-        else:
-            inner_params = quoted_params
-
-        original_inner_params = inner_params
-        modified_inner_params = inner_params
-
-        # Only process modification on the first matching line
-        if not first_match_processed:
-            # Remove text if specified
-            if text_to_remove:
-                # Remove text with proper boundary handling for space-separated params
-                modified_inner_params = re.sub(
-                    r"(^|\s)" + re.escape(text_to_remove) + r"(\s|$)",
-                    r"\1 \2",
-                    modified_inner_params,
-                )
-                # Clean up extra spaces
-                modified_inner_params = re.sub(
-                    r"\s+", " ", modified_inner_params
-                ).strip()
-
-            # Add text if specified
-            if text_to_add and text_to_add not in modified_inner_params.split():
-                if modified_inner_params:
-                    modified_inner_params = f"{modified_inner_params} {text_to_add}"
-                else:
-                    modified_inner_params = text_to_add
-
-            if modified_inner_params != original_inner_params:
-                needs_change = True
-                # Reconstruct the quoted string
-                new_quoted_params = f'"{modified_inner_params}"'
-                new_lines.append(f"{description}{new_quoted_params}")
-                first_match_processed = True
-                continue
-            else:
-                new_lines.append(line)
-                first_match_processed = True
-        else:
-            new_lines.append(line)
+    # Only the first boot entry line is edited; comments and blank lines never
+    # match, and the rest of the file is left byte-for-byte intact
+    new_content = _REFIND_LINE_RE.sub(edit_params, content, count=1)
 
-    return "".join(new_lines), needs_change
+    return new_content, needs_change
 
 
 def modify_grub_config(
@@ -407,12 +366,9 @@ def modify_grub_config(
     Returns:
         A tuple of (modified_content, needs_change)
     """
-    # Define the pattern to match GRUB command line definitions - capturing prefix and quoted content
-    pattern = r'^(GRUB_CMDLINE_LINUX(_DEFAULT)?=")([^"]*)"'
-
     # Use the generic function for pattern-based modification
     new_content, needs_change = _modify_line_with_pattern(
-        content, pattern, text_to_add, text_to_remove
+        content, _GRUB_CMDLINE_RE, text_to_add, text_to_remove
     )
 
     return new_content, needs_change
@@ -432,13 +388,9 @@ def modify_limine_config(
     Returns:
         A tuple of (modified_content, needs_change)
     """
-    # Define the pattern to match Limine command line definitions - capturing prefix and quoted content
-    # Fixed pattern: use multiline matching to find the line anywhere in content
-    pattern = r'^(KERNEL_CMDLINE\[default\]\+?=")([^"]*)"'
-
     # Use the generic function for pattern-based modification
     new_content, needs_change = _modify_line_with_pattern(
-        content, pattern, text_to_add, text_to_remove
+        content, _LIMINE_CMDLINE_RE, text_to_add, text_to_remove
     )
 
     return new_content, needs_change
@@ -459,9 +411,15 @@ def modify_config(
         module.fail_json(msg="Could not determine config file path")
         return False, "Could not determine config file path"
 
-    if not os.path.exists(config_path):
+    # Reading doubles as the existence check, saving a separate stat
+    try:
+        original_content = _read_file(config_path)
+    except FileNotFoundError:
         module.fail_json(msg=f"Config file {config_path} does not exist")
         return False, f"Config file {config_path} does not exist"
+    except (IOError, UnicodeDecodeError) as e:
+        module.fail_json(msg=f"Failed to read config file: {str(e)}")
+        return False, f"Failed to read config file: {str(e)}"
 
     backup_file = config_path + ".bak"
     if os.path.exists(backup_file):
@@ -470,13 +428,6 @@ def modify_config(
         )
         return False, f"Backup file {backup_file} already exists."
 
-    try:
-        with open(config_path, "r") as f:
-            original_content = f.read()
-    except IOError as e:
-        module.fail_json(msg=f"Failed to read config file: {str(e)}")
-        return False, f"Failed to read config file: {str(e)}"
-
     # Map bootloader types to their modification functions
     modifier_funcs: Dict[str, Callable] = {
         "systemd-boot": modify_systemd_boot_config,
@@ -503,12 +454,45 @@ def modify_config(
     if not create_backup(module, config_path):
         return False, "Failed to create backup"
 
-    if not write_config(module, config_path, new_content, config_path + ".bak"):
+    if not write_config(module, config_path, new_content):
         return False, "Failed to write config file"
 
     return True, f"Updated {bootloader_type} configuration at {config_path}"
 
 
+def _line_has_arg(
+    content: str, marker: str, kernel_args: str, closing: str = ""
+) -> bool:
+    """
+    Case-insensitively check for a marker line holding kernel_args before closing.
+
+    Args:
+        content: The configuration content to search
+        marker: Prefix the line must start with, ignoring indentation
+        kernel_args: The arguments to look for
+        closing: Text that must follow the arguments on the same line
+
+    Returns:
+        True if any line matches
+    """
+    lowered = content.lower()
+    args = kernel_args.lower()
+    # Plain substring scans; most checks end here when the arguments are absent
+    if args not in lowered:
+        return False
+
+    marker = marker.lower()
+    for line in lowered.splitlines():
+        # A prefix test skips commented-out and unrelated lines outright
+        line = line.lstrip()
+        if not line.startswith(marker):
+            continue
+        found = line.find(args, len(marker))
+        if found != -1 and closing in line[found + len(args) :]:
+            return True
+    return False
+
+
 def check_kernel_args_exist(
     module: AnsibleModule,
     bootloader_type: str,
@@ -520,45 +504,29 @@ def check_kernel_args_exist(
         module.fail_json(msg="Could not determine config file path")
         return False
 
-    if not os.path.exists(config_path):
+    try:
+        content = _read_file(config_path)
+    except FileNotFoundError:
         module.fail_json(msg=f"Config file {config_path} does not exist")
         return False
-
-    try:
-        with open(config_path, "r") as f:
-            content = f.read()
-    except IOError as e:
+    except (IOError, UnicodeDecodeError) as e:
         module.fail_json(msg=f"Failed to read config file: {str(e)}")
         return False
 
     if bootloader_type == "systemd-boot":
-        return bool(
-            re.search(r"options.*" + re.escape(kernel_args), content, re.IGNORECASE)
-        )
+        return _line_has_arg(content, "options", kernel_args)
     elif bootloader_type == "refind":
         for line in content.split("\n"):
-            match = re.match(r'^(\s*"[^"]*"\s*)(.*)', line)
+            match = _REFIND_PARAMS_RE.match(line)
             if match:
                 _, params = match.groups()
                 if kernel_args in params:
                     return True
         return False
     elif bootloader_type == "grub":
-        return bool(
-            re.search(
-                r'GRUB_CMDLINE_LINUX_DEFAULT=".*' + re.escape(kernel_args) + '.*"',
-                content,
-                re.IGNORECASE,
-            )
-        )
+        return _line_has_arg(content, 'GRUB_CMDLINE_LINUX_DEFAULT="', kernel_args, '"')
     elif bootloader_type == "limine":
-        return bool(
-            re.search(
-                r'KERNEL_CMDLINE\[default\]\+=".*' + re.escape(kernel_args) + '.*"',
-                content,
-                re.IGNORECASE,
-            )
-        )
+        return _line_has_arg(content, 'KERNEL_CMDLINE[default]+="', kernel_args, '"')
     else:
         module.fail_json(msg=f"Unsupported bootloader type: {bootloader_type}")
         return False
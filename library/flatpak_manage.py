@@ -1,7 +1,7 @@
 #!/usr/bin/python3
 
 import subprocess
-from typing import Dict, List, Literal, Union
+from typing import Dict, List, Literal, Set, Union
 
 from ansible.module_utils.basic import AnsibleModule
 
@@ -20,39 +20,52 @@ def get_installed_flatpaks(scope: Literal["user", "system"]) -> List[str]:
     return installed
 
 
-def install_flatpak(
+def install_flatpaks(
     module: AnsibleModule,
-    app_id: str,
+    app_ids: List[str],
     scope: Literal["user", "system"],
     remote: str = "flathub",
 ) -> bool:
-    """Install a Flatpak application"""
-    if scope == "user":
-        cmd = ["flatpak", "install", "--user", "-y", remote, app_id]
-    else:
-        cmd = ["flatpak", "install", "--system", "-y", remote, app_id]
+    """Install Flatpak applications with a single flatpak invocation"""
+    # One transaction resolves runtimes and pulls from the remote once for
+    # every app instead of once per app
+    cmd = ["flatpak", "install", f"--{scope}", "-y", remote, *app_ids]
 
     rc, _, err = module.run_command(cmd)
     if rc != 0:
-        module.fail_json(msg=f"Failed to install {app_id}: {err}")
+        module.fail_json(msg=f"Failed to install {', '.join(app_ids)}: {err}")
     return True
 
 
-def uninstall_flatpak(
-    module: AnsibleModule, app_id: str, scope: Literal["user", "system"]
+def uninstall_flatpaks(
+    module: AnsibleModule, app_ids: List[str], scope: Literal["user", "system"]
 ) -> bool:
-    """Uninstall a Flatpak application"""
-    if scope == "user":
-        cmd = ["flatpak", "uninstall", "--user", "-y", app_id]
-    else:
-        cmd = ["flatpak", "uninstall", "--system", "-y", app_id]
+    """Uninstall Flatpak applications with a single flatpak invocation"""
+    cmd = ["flatpak", "uninstall", f"--{scope}", "-y", *app_ids]
 
     rc, _, err = module.run_command(cmd)
     if rc != 0:
-        module.fail_json(msg=f"Failed to uninstall {app_id}: {err}")
+        module.fail_json(msg=f"Failed to uninstall {', '.join(app_ids)}: {err}")
     return True
 
 
+def install_flatpak(
+    module: AnsibleModule,
+    app_id: str,
+    scope: Literal["user", "system"],
+    remote: str = "flathub",
+) -> bool:
+    """Install a Flatpak application; kept for callers of the single-app API"""
+    return install_flatpaks(module, [app_id], scope, remote)
+
+
+def uninstall_flatpak(
+    module: AnsibleModule, app_id: str, scope: Literal["user", "system"]
+) -> bool:
+    """Uninstall a Flatpak application; kept for callers of the single-app API"""
+    return uninstall_flatpaks(module, [app_id], scope)
+
+
 def run_module() -> None:
     module_args = dict(
         packages=dict(type="list", required=True),
@@ -88,6 +101,12 @@ def run_module() -> None:
     # Get currently installed packages
     installed: List[str] = get_installed_flatpaks(scope)
 
+    # Hashed copies for membership tests; the lists keep their order so the
+    # reported added/removed/kept/skipped entries follow the inputs
+    installed_set: Set[str] = set(installed)
+    packages_set: Set[str] = set(packages)
+    skip_set: Set[str] = set(skip_packages)
+
     to_add: List[str] = []
     to_remove: List[str] = []
     to_keep: List[str] = []
@@ -95,38 +114,30 @@ def run_module() -> None:
 
     if state == "present":
         # Packages to add (present in desired but not in installed)
-        to_add = [pkg for pkg in packages if pkg not in installed]
+        to_add = [pkg for pkg in packages if pkg not in installed_set]
 
-        # Packages to remove (present in installed but not in desired)
+        # Installed packages that are not desired
+        extra = [pkg for pkg in installed if pkg not in packages_set]
         if remove_extra:
-            # Filter out skip_packages from removal list
-            to_remove = [
-                pkg
-                for pkg in installed
-                if pkg not in packages and pkg not in skip_packages
-            ]
-            # Track packages that would have been removed but were skipped
-            to_skip = [
-                pkg for pkg in installed if pkg not in packages and pkg in skip_packages
-            ]
+            # Filter out skip_packages from removal list and track them as
+            # skipped instead
+            to_remove = [pkg for pkg in extra if pkg not in skip_set]
+            to_skip = [pkg for pkg in extra if pkg in skip_set]
         else:
-            to_keep = [pkg for pkg in installed if pkg not in packages]
+            to_keep = extra
     else:  # state == 'absent'
         # Only remove packages that are in both desired and installed, and not in skip_packages
-        to_remove = [
-            pkg for pkg in packages if pkg in installed and pkg not in skip_packages
-        ]
-        to_skip = [pkg for pkg in packages if pkg in installed and pkg in skip_packages]
+        present = [pkg for pkg in packages if pkg in installed_set]
+        to_remove = [pkg for pkg in present if pkg not in skip_set]
+        to_skip = [pkg for pkg in present if pkg in skip_set]
 
     # Process changes
     if not module.check_mode:
-        for pkg in to_add:
-            if install_flatpak(module, pkg, scope, remote):
-                result["added"].append(pkg)  # type: ignore
+        if to_add and install_flatpaks(module, to_add, scope, remote):
+            result["added"] = to_add
 
-        for pkg in to_remove:
-            if uninstall_flatpak(module, pkg, scope):
-                result["removed"].append(pkg)  # type: ignore
+        if to_remove and uninstall_flatpaks(module, to_remove, scope):
+            result["removed"] = to_remove
     else:
         result["added"] = to_add
         result["removed"] = to_remove
@@ -1,13 +1,37 @@
-import os
 import sys
 import tempfile
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
+from ansible.module_utils.basic import AnsibleModule
 
-# Add the project root directory to sys.path so we can import the modules
+# Add the project root directory to sys.path so we can import the modules and
+# the shared helpers in tests/helpers.py
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from tests.helpers import RUN_OK, FailJson
+
+# bootloader_mod.main() argument defaults; copied per test so updates stay local
+_BOOTLOADER_BASE_PARAMS = {
+    "text_to_add": None,
+    "text_to_remove": None,
+    "detect_only": False,
+    "check_args": None,
+    "bootloader": "auto",
+    "config_file": None,
+}
+
+# flatpak_manage.run_module() argument defaults
+_FLATPAK_BASE_PARAMS = {
+    "packages": [],
+    "scope": "user",
+    "remote": "flathub",
+    "state": "present",
+    "remove_extra": False,
+    "skip_packages": [],
+}
+
 
 @pytest.fixture
 def ansible_module_params():
@@ -16,11 +40,15 @@ def ansible_module_params():
 
 
 @pytest.fixture
-def temp_config_file():
-    """Create a temporary configuration file for testing"""
-    with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".conf") as f:
-        yield f.name
-    os.unlink(f.name)
+def temp_config_file(tmp_path):
+    """Create an empty configuration file in the test's own directory
+
+    Siblings the code under test creates next to it (.bak backups, atomic
+    write temp files) are cleaned up with tmp_path instead of leaking.
+    """
+    config = tmp_path / "config.conf"
+    config.touch()
+    return str(config)
 
 
 @pytest.fixture
@@ -34,14 +62,77 @@ def temp_dir():
     shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+@pytest.fixture
+def patched_open(mocker, request):
+    """Make open() inside bootloader_mod raise the indirect param
+
+    Only the module's own global is shadowed, so pytest and the rest of the
+    process keep the real builtins.open. Successful writes are tested against
+    real files under tmp_path instead.
+    """
+    return mocker.patch("bootloader_mod.open", side_effect=request.param, create=True)
+
+
+@pytest.fixture
+def patched_read(mocker, request):
+    """Patch bootloader_mod._read_file; an indirect param supplies content or an exception"""
+    param = getattr(request, "param", "")
+    if isinstance(param, BaseException):
+        return mocker.patch("bootloader_mod._read_file", side_effect=param)
+    return mocker.patch("bootloader_mod._read_file", return_value=param)
+
+
 @pytest.fixture
 def mock_ansible_module(mocker):
     """Create a standardized mock Ansible module for testing"""
-    mock_module = mocker.Mock()
+    mock_module = mocker.Mock(spec=AnsibleModule)
     mock_module.params = {}
     mock_module.check_mode = False
-    mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
+    mock_module.fail_json = FailJson()
     mock_module.exit_json = mocker.Mock()
     mock_module.warn = mocker.Mock()
-    mock_module.run_command = mocker.Mock(return_value=(0, "", ""))
+    mock_module.run_command = mocker.Mock(return_value=RUN_OK)
     return mock_module
+
+
+@pytest.fixture
+def patched_bootloader_mod(mocker, mock_ansible_module):
+    """Patch bootloader_mod's collaborators once for tests that drive main()
+
+    The returned namespace exposes the module mock and each patch so tests
+    only adjust the deltas (params, return values, side effects).
+    """
+    mock_ansible_module.params = dict(_BOOTLOADER_BASE_PARAMS)
+    return SimpleNamespace(
+        module=mock_ansible_module,
+        ansible_module=mocker.patch(
+            "bootloader_mod.AnsibleModule", return_value=mock_ansible_module
+        ),
+        detect_bootloader=mocker.patch(
+            "bootloader_mod.detect_bootloader", return_value="systemd-boot"
+        ),
+        get_bootloader_config=mocker.patch(
+            "bootloader_mod.get_bootloader_config",
+            return_value="/boot/loader/entries/linux-cachyos.conf",
+        ),
+        exists=mocker.patch("bootloader_mod.os.path.exists", return_value=True),
+        copy2=mocker.patch("bootloader_mod.shutil.copy2"),
+    )
+
+
+@pytest.fixture
+def flatpak_module(mocker):
+    """Factory that patches flatpak_manage.AnsibleModule to return a fresh mock
+
+    Keyword arguments override the default params; check_mode is set on the
+    module itself.
+    """
+
+    def _make(check_mode=False, **params):
+        module = mocker.Mock()
+        module.params = {**_FLATPAK_BASE_PARAMS, **params}
+        module.check_mode = check_mode
+        mocker.patch("flatpak_manage.AnsibleModule", return_value=module)
+        return module
+
+    return _make
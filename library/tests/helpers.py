@@ -0,0 +1,42 @@
+"""Shared test doubles, imported by conftest and the test modules"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Successful run_command result; tuples are immutable, so one object is shared
+RUN_OK = (0, "", "")
+
+
+class FailJson:
+    """Plain stand-in for AnsibleModule.fail_json that records calls and exits
+
+    The SystemExit carries the message, so ``pytest.raises(SystemExit,
+    match=...)`` alone proves the failure and its reason.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        raise SystemExit(kwargs.get("msg", 1))
+
+
+class FakeExists(dict):
+    """Table-driven os.path.exists fake; paths missing from the table are absent"""
+
+    def __call__(self, path):
+        return self.get(path, False)
+
+
+def fake_module(**params):
+    """Lightweight AnsibleModule stand-in for tests that only read attributes
+
+    exit_json and fail_json stay MagicMocks so call assertions keep working.
+    """
+    return SimpleNamespace(
+        params=params,
+        check_mode=False,
+        exit_json=MagicMock(),
+        fail_json=MagicMock(),
+    )
@@ -1,6 +1,21 @@
+"""Tests for bootloader_mod.
+
+Every test works against mocks or its own temporary file, so the module has
+no shared state and needs no xdist_group marker under pytest-xdist. Run it
+with ``pytest -n auto --dist=loadscope`` to keep each class on one worker.
+"""
+
+import functools
+import os
+import re
+
 import pytest
 
+import bootloader_mod
 from bootloader_mod import (
+    _add_or_remove_parameter,
+    _read_file,
+    _update_quoted_line_params,
     check_kernel_args_exist,
     create_backup,
     detect_bootloader,
@@ -10,30 +25,584 @@ from bootloader_mod import (
     modify_limine_config,
     modify_refind_config,
     modify_systemd_boot_config,
+    safe_path_exists,
     write_config,
 )
+from tests.helpers import FailJson, FakeExists, fake_module
+
+# Resolve the patch target once instead of walking the dotted path per test
+_OS_PATH = bootloader_mod.os.path
+
+_SYSTEMD_CONFIG = "/boot/loader/entries/linux-cachyos.conf"
+
+# The systemd-boot config is present and its .bak backup is absent
+_EXISTS_MAP = {
+    _SYSTEMD_CONFIG: True,
+    _SYSTEMD_CONFIG + ".bak": False,
+}
+
+
+_SYSTEMD_BASE = "title    Arch Linux\nlinux    /vmlinuz-linux\nefi      /EFI/Linux/arch-stable.efi\noptions  root=PARTUUID=12345 ro"
+_SYSTEMD_WITH_QUIET = _SYSTEMD_BASE + " quiet"
+_GRUB_BASE = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"'
+_GRUB_WITH_MITIGATIONS = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash mitigations=auto"'
+_LIMINE_BASE = 'ESP_PATH="/boot"\nKERNEL_CMDLINE[default]+="quiet nowatchdog splash"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"'
+_LIMINE_WITH_MITIGATIONS = 'ESP_PATH="/boot"\nKERNEL_CMDLINE[default]+="quiet nowatchdog splash mitigations=auto"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"'
+_REFIND_BASE = '"Boot with standard options" "root=PARTUUID=12345 ro quiet splash"'
+_READ_DATA = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="splash"'
+_SYSTEMD_SHORT = "title Arch Linux\noptions root=PARTUUID=12345 ro"
+_SYSTEMD_TWO_OPTIONS = (
+    "title Arch Linux\noptions root=PARTUUID=12345 ro\noptions quiet\n"
+)
+_LIMINE_SHORT = 'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash"'
+_LIMINE_SHORT_WITH_MITIGATIONS = (
+    'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash mitigations=auto"'
+)
+
+_DISPATCH = {
+    "systemd_boot": modify_systemd_boot_config,
+    "refind": modify_refind_config,
+    "grub": modify_grub_config,
+    "limine": modify_limine_config,
+}
+
+# (func, content, add, remove, expected_change, should_contain,
+#  should_not_contain, count_before); count_before is how often a rEFInd
+# removal token occurs before the edit, since later entries keep theirs
+_MODIFY_CASES = (
+    # systemd-boot tests
+    (
+        "systemd_boot",
+        _SYSTEMD_BASE,
+        "quiet",
+        None,
+        True,
+        "quiet",
+        "",
+        None,
+    ),
+    (
+        "systemd_boot",
+        _SYSTEMD_WITH_QUIET,
+        None,
+        "quiet",
+        True,
+        "",
+        "quiet",
+        None,
+    ),
+    (
+        "systemd_boot",
+        _SYSTEMD_BASE,
+        None,
+        "quiet",
+        False,
+        "",
+        "",
+        None,
+    ),
+    # refind tests
+    (
+        "refind",
+        '"Boot with standard options" "root=PARTUUID=12345 ro"\n"Boot with fallback initramfs" "root=PARTUUID=12345 ro initramfs-linux-fallback.img"',
+        "quiet",
+        None,
+        True,
+        "quiet",
+        "",
+        None,
+    ),
+    (
+        "refind",
+        '"Boot with standard options" "root=PARTUUID=12345 ro quiet"\n"Boot with fallback" "root=PARTUUID=12345 ro"',
+        None,
+        "quiet",
+        True,
+        "",
+        "quiet",
+        1,
+    ),
+    # GRUB tests
+    (
+        "grub",
+        _GRUB_BASE,
+        "intel_pstate=disable",
+        None,
+        True,
+        "intel_pstate=disable",
+        "",
+        None,
+    ),
+    (
+        "grub",
+        _GRUB_WITH_MITIGATIONS,
+        None,
+        "mitigations=auto",
+        True,
+        "",
+        "mitigations=auto",
+        None,
+    ),
+    # Limine tests
+    (
+        "limine",
+        _LIMINE_BASE,
+        "intel_pstate=disable",
+        None,
+        True,
+        "intel_pstate=disable",
+        "",
+        None,
+    ),
+    (
+        "limine",
+        _LIMINE_WITH_MITIGATIONS,
+        None,
+        "mitigations=auto",
+        True,
+        "",
+        "mitigations=auto",
+        None,
+    ),
+)
+_MODIFY_IDS = [
+    "systemd_add",
+    "systemd_remove",
+    "systemd_remove_absent",
+    "refind_add",
+    "refind_remove",
+    "grub_add",
+    "grub_remove",
+    "limine_add",
+    "limine_remove",
+]
+
+# (func, content, add, remove, must_contain, must_not_contain, expected_change)
+_VARIANT_CASES = (
+    (
+        "limine",
+        _LIMINE_BASE,
+        "intel_pstate=enable",
+        None,
+        ("intel_pstate=enable",),
+        (),
+        True,
+    ),
+    (
+        "limine",
+        _LIMINE_WITH_MITIGATIONS,
+        None,
+        "mitigations=auto",
+        ("quiet nowatchdog splash",),
+        ("mitigations=auto",),
+        True,
+    ),
+    (
+        "limine",
+        'ESP_PATH="/boot"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"\nTIMEOUT=2',
+        "newparam=value",
+        None,
+        ("newparam=value",),
+        (),
+        True,
+    ),
+    (
+        "refind",
+        (
+            '"Boot with standard options" "root=PARTUUID=12345 ro quiet"\n'
+            '"Boot with fallback initramfs" "root=PARTUUID=12345 ro initramfs-linux-fallback.img"'
+        ),
+        "newparam",
+        "quiet",
+        ("newparam",),
+        ("quiet",),
+        True,
+    ),
+    (
+        "systemd_boot",
+        "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi\noptions root=PARTUUID=12345 ro",
+        "quiet",
+        None,
+        ("root=PARTUUID=12345 ro quiet",),
+        (),
+        True,
+    ),
+    (
+        "systemd_boot",
+        "title Arch Linux\noptions quiet splash test=123 test=456",
+        None,
+        "test=123",
+        ("test=456",),
+        ("test=123",),
+        True,
+    ),
+    (
+        "systemd_boot",
+        "title Arch Linux\noptions quiet splash test_value",
+        None,
+        "test",
+        ("test_value",),
+        ("test",),
+        False,
+    ),
+    (
+        "systemd_boot",
+        "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi",
+        "quiet",
+        None,
+        ("options quiet",),
+        (),
+        True,
+    ),
+    (
+        "grub",
+        _GRUB_BASE,
+        "param_with=equals=signs",
+        None,
+        ("param_with=equals=signs",),
+        (),
+        True,
+    ),
+    (
+        "grub",
+        'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash param_to_remove=123"',
+        None,
+        "param_to_remove=123",
+        (),
+        ("param_to_remove=123",),
+        True,
+    ),
+    ("refind", _REFIND_BASE, "newparam", "quiet", ("newparam",), ("quiet",), True),
+    (
+        "refind",
+        '"Boot with standard options" ""\n"Boot with params" "root=PARTUUID=test"',
+        "newparam",
+        None,
+        ("newparam",),
+        (),
+        True,
+    ),
+    (
+        "grub",
+        'GRUB_CMDLINE_LINUX="existing_param"\nGRUB_TIMEOUT=5',
+        "new_param",
+        None,
+        ("new_param",),
+        (),
+        True,
+    ),
+    (
+        "grub",
+        'GRUB_CMDLINE_LINUX_DEFAULT="quiet splash mitigations=auto intel_pstate=disable"',
+        None,
+        "mitigations=auto",
+        ("quiet splash",),
+        ("mitigations=auto",),
+        True,
+    ),
+    (
+        "grub",
+        (
+            'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX="quiet splash"\n'
+            'GRUB_CMDLINE_LINUX_DEFAULT="intel_pstate=enable"'
+        ),
+        "new_param",
+        "quiet",
+        ("new_param",),
+        (),
+        True,
+    ),
+    (
+        "refind",
+        (
+            '"Boot with standard options" "root=PARTUUID=12345 ro quiet splash"\n'
+            '"Boot with fallback" "root=PARTUUID=12345 ro quiet"'
+        ),
+        "newparam",
+        "splash",
+        ("newparam",),
+        (),
+        True,
+    ),
+    (
+        "grub",
+        "GRUB_DEFAULT=0\nGRUB_TIMEOUT=5",
+        "newparam",
+        None,
+        ('GRUB_CMDLINE_LINUX_DEFAULT="newparam"',),
+        (),
+        True,
+    ),
+    (
+        "systemd_boot",
+        _SYSTEMD_WITH_QUIET,
+        None,
+        "quiet",
+        ("root=PARTUUID=12345 ro",),
+        ("quiet",),
+        True,
+    ),
+    (
+        "systemd_boot",
+        _SYSTEMD_WITH_QUIET,
+        "splash",
+        "quiet",
+        ("splash",),
+        ("quiet",),
+        True,
+    ),
+    (
+        "refind",
+        _REFIND_BASE,
+        None,
+        "quiet",
+        ("root=PARTUUID=12345 ro splash",),
+        ("quiet",),
+        True,
+    ),
+    (
+        "grub",
+        _GRUB_BASE,
+        "intel_pstate=enable",
+        "quiet",
+        ('"splash intel_pstate=enable"',),
+        ("quiet",),
+        True,
+    ),
+    (
+        "grub",
+        _GRUB_WITH_MITIGATIONS,
+        None,
+        "mitigations=auto",
+        ("quiet splash",),
+        ("mitigations=auto",),
+        True,
+    ),
+    ("systemd_boot", "", "quiet", None, ("options quiet",), (), True),
+    (
+        "grub",
+        "GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_THEME=/boot/grub/themes/Arc/theme.txt",
+        "quiet",
+        None,
+        ("quiet",),
+        (),
+        True,
+    ),
+    (
+        "systemd_boot",
+        "title Test\noptions test_value other_test_value",
+        None,
+        "test",
+        ("test_value other_test_value",),
+        ("test",),
+        False,
+    ),
+    (
+        "grub",
+        (
+            'GRUB_DEFAULT=0\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"\n'
+            'GRUB_CMDLINE_LINUX="systemd.debug"\nGRUB_TIMEOUT=5'
+        ),
+        "intel_pstate=enable",
+        "quiet",
+        ('"systemd.debug intel_pstate=enable"',),
+        ("quiet",),
+        True,
+    ),
+    (
+        "limine",
+        _LIMINE_SHORT,
+        "intel_pstate=enable",
+        None,
+        ("quiet splash intel_pstate=enable",),
+        (),
+        True,
+    ),
+    (
+        "limine",
+        _LIMINE_SHORT_WITH_MITIGATIONS,
+        None,
+        "mitigations=auto",
+        ('"quiet splash"',),
+        ("mitigations=auto",),
+        True,
+    ),
+    (
+        "limine",
+        _LIMINE_SHORT,
+        "intel_pstate=enable",
+        "quiet",
+        ('"splash intel_pstate=enable"',),
+        ("quiet",),
+        True,
+    ),
+    (
+        "limine",
+        _LIMINE_SHORT,
+        None,
+        "nonexistent",
+        (_LIMINE_SHORT,),
+        (),
+        False,
+    ),
+    (
+        "grub",
+        'GRUB_DEFAULT=0\nGRUB_CMDLINE_LINUX=""\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"',
+        "intel_pstate=enable",
+        None,
+        (
+            'GRUB_CMDLINE_LINUX="intel_pstate=enable"',
+            '"quiet splash intel_pstate=enable"',
+        ),
+        (),
+        True,
+    ),
+    (
+        "refind",
+        '"Boot 1" "param1 param2"\n"Boot 2" "param3 param4"',
+        "newparam",
+        "param1",
+        ('"Boot 1" "param2 newparam"', '"Boot 2" "param3 param4"'),
+        ("param1",),
+        True,
+    ),
+    (
+        "refind",
+        "# This is a comment\n# Another comment\nsome_other_line 123",
+        "newparam",
+        None,
+        ("# This is a comment\n# Another comment\nsome_other_line 123",),
+        ("newparam",),
+        False,
+    ),
+    (
+        "systemd_boot",
+        _SYSTEMD_TWO_OPTIONS,
+        "quiet",
+        None,
+        ("options root=PARTUUID=12345 ro\noptions quiet",),
+        (),
+        False,
+    ),
+    (
+        "systemd_boot",
+        _SYSTEMD_TWO_OPTIONS,
+        "splash",
+        None,
+        ("options root=PARTUUID=12345 ro splash\noptions quiet\n",),
+        (),
+        True,
+    ),
+)
+_VARIANT_IDS = [
+    "limine_add_existing_line",
+    "limine_remove_existing_line",
+    "limine_add_no_line",
+    "refind_add_remove_multi_entry",
+    "systemd_add_to_options_line",
+    "systemd_remove_exact_token",
+    "systemd_remove_boundary",
+    "systemd_no_options_line",
+    "grub_add_special_chars",
+    "grub_remove_special_chars",
+    "refind_add_remove_single_entry",
+    "refind_add_empty_params",
+    "grub_add_linux_line",
+    "grub_remove_complex_line",
+    "grub_multiple_lines",
+    "refind_multiple_entries",
+    "grub_add_no_match",
+    "systemd_remove_only",
+    "systemd_add_and_remove",
+    "refind_remove_only",
+    "grub_add_and_remove",
+    "grub_remove_only",
+    "systemd_empty_content",
+    "grub_no_cmdline_vars",
+    "systemd_remove_boundary_multi",
+    "grub_multiline_cmdline",
+    "limine_add",
+    "limine_remove",
+    "limine_add_and_remove",
+    "limine_no_change",
+    "grub_add_empty_linux_line",
+    "refind_first_entry_only",
+    "refind_no_entries",
+    "systemd_add_present_on_second_options_line",
+    "systemd_add_to_first_options_line",
+]
+
+
+@functools.lru_cache(maxsize=64)
+def _token_re(token):
+    """Compile a pattern matching token only as a whole kernel argument
+
+    Arguments are delimited by whitespace or the surrounding quotes, so
+    ``test`` does not match inside ``test_value``.
+    """
+    return re.compile(rf'(?<![^\s"]){re.escape(token)}(?![^\s"])')
+
+
+def _assert_params(content, present=(), absent=()):
+    """Assert all present substrings occur in content and no absent token does"""
+    missing = [p for p in present if p not in content]
+    leftover = [a for a in absent if _token_re(a).search(content)]
+    assert not missing and not leftover, (missing, leftover, content)
+
+
+@pytest.fixture
+def fake_exists(mocker):
+    """Patch os.path.exists with a per-test FakeExists seeded from _EXISTS_MAP
+
+    Tests reconfigure it with ``fake_exists[path] = True/False``.
+    """
+    exists = FakeExists(_EXISTS_MAP)
+    mocker.patch.object(_OS_PATH, "exists", side_effect=exists)
+    return exists
+
+
+@pytest.fixture(scope="class")
+def config_for(tmp_path_factory):
+    """Write each distinct config body once per class for read-only checks
+
+    ``None`` maps to a path that is never created.
+    """
+    root = tmp_path_factory.mktemp("kernel_args")
+    paths = {None: str(root / "missing.conf")}
+
+    def _path(content):
+        if content not in paths:
+            path = root / f"{len(paths)}.conf"
+            path.write_text(content)
+            paths[content] = str(path)
+        return paths[content]
+
+    return _path
+
+
+# Bootloaders in the order detect_bootloader probes them
+_DETECT_PRIORITY = ["systemd-boot", "refind", "grub", "limine"]
 
 
 class TestBootloaderDetection:
     """Test bootloader detection functions"""
 
     @pytest.mark.parametrize(
-        "exists_side_effect,expected_result",
-        [
-            ([True, True, True], "systemd-boot"),  # systemd-boot exists
-            ([False, True, True], "refind"),  # refind exists, systemd-boot doesn't
-            ([False, False, True], "grub"),  # grub exists, others don't
-            ([False, False, False], "none"),  # none exist
-        ],
+        "misses,expected",
+        list(enumerate([*_DETECT_PRIORITY, "none"])),
+        ids=[*_DETECT_PRIORITY, "none"],
     )
-    def test_detect_bootloader_parametrized(
-        self, mocker, exists_side_effect, expected_result
-    ):
-        """Test bootloader detection for different scenarios using parametrization"""
-        mock_exists = mocker.patch("bootloader_mod.os.path.exists")
-        mock_exists.side_effect = exists_side_effect
-        result = detect_bootloader()
-        assert result == expected_result
+    def test_detect_bootloader_returns_first_present(self, mocker, misses, expected):
+        """Each bootloader wins once every higher-priority probe misses
+
+        Detection must stop probing at the first config that exists.
+        """
+        hits = len(_DETECT_PRIORITY) - misses
+        exists = mocker.patch.object(
+            _OS_PATH, "exists", side_effect=[False] * misses + [True] * hits
+        )
+        assert detect_bootloader() == expected
+        assert exists.call_count == min(misses + 1, len(_DETECT_PRIORITY))
 
     def test_get_bootloader_config_with_custom_file(self):
         """Test getting custom config file"""
@@ -44,7 +613,7 @@ class TestBootloaderDetection:
     @pytest.mark.parametrize(
         "bootloader_type,expected_path",
         [
-            ("systemd-boot", "/boot/loader/entries/linux-cachyos.conf"),
+            ("systemd-boot", _SYSTEMD_CONFIG),
             ("refind", "/boot/refind_linux.conf"),
             ("grub", "/etc/default/grub"),
         ],
@@ -59,94 +628,9 @@ class TestBootloaderConfigModification:
     """Test configuration modification functions using parametrization"""
 
     @pytest.mark.parametrize(
-        "func_name,content,text_to_add,text_to_remove,expected_change,should_contain,should_not_contain",
-        [
-            # systemd-boot tests
-            (
-                "systemd_boot",
-                "title    Arch Linux\nlinux    /vmlinuz-linux\nefi      /EFI/Linux/arch-stable.efi\noptions  root=PARTUUID=12345 ro",
-                "quiet",
-                None,
-                True,
-                "quiet",
-                "",
-            ),
-            (
-                "systemd_boot",
-                "title    Arch Linux\nlinux    /vmlinuz-linux\nefi      /EFI/Linux/arch-stable.efi\noptions  root=PARTUUID=12345 ro quiet",
-                None,
-                "quiet",
-                True,
-                "",
-                "quiet",
-            ),
-            (
-                "systemd_boot",
-                "title    Arch Linux\nlinux    /vmlinuz-linux\nefi      /EFI/Linux/arch-stable.efi\noptions  root=PARTUUID=12345 ro",
-                None,
-                "quiet",
-                False,
-                "",
-                "",
-            ),
-            # refind tests
-            (
-                "refind",
-                '"Boot with standard options" "root=PARTUUID=12345 ro"\n"Boot with fallback initramfs" "root=PARTUUID=12345 ro initramfs-linux-fallback.img"',
-                "quiet",
-                None,
-                True,
-                "quiet",
-                "",
-            ),
-            (
-                "refind",
-                '"Boot with standard options" "root=PARTUUID=12345 ro quiet"\n"Boot with fallback" "root=PARTUUID=12345 ro"',
-                None,
-                "quiet",
-                True,
-                "",
-                "quiet",
-            ),
-            # GRUB tests
-            (
-                "grub",
-                'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"',
-                "intel_pstate=disable",
-                None,
-                True,
-                "intel_pstate=disable",
-                "",
-            ),
-            (
-                "grub",
-                'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash mitigations=auto"',
-                None,
-                "mitigations=auto",
-                True,
-                "",
-                "mitigations=auto",
-            ),
-            # Limine tests
-            (
-                "limine",
-                'ESP_PATH="/boot"\nKERNEL_CMDLINE[default]+="quiet nowatchdog splash"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"',
-                "intel_pstate=disable",
-                None,
-                True,
-                "intel_pstate=disable",
-                "",
-            ),
-            (
-                "limine",
-                'ESP_PATH="/boot"\nKERNEL_CMDLINE[default]+="quiet nowatchdog splash mitigations=auto"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"',
-                None,
-                "mitigations=auto",
-                True,
-                "",
-                "mitigations=auto",
-            ),
-        ],
+        "func_name,content,text_to_add,text_to_remove,expected_change,should_contain,should_not_contain,count_before",
+        _MODIFY_CASES,
+        ids=_MODIFY_IDS,
     )
     def test_modify_bootloader_config_parametrized(
         self,
@@ -157,35 +641,13 @@ class TestBootloaderConfigModification:
         expected_change,
         should_contain,
         should_not_contain,
+        count_before,
     ):
         """Parametrized test for all bootloader config modification functions"""
-        from bootloader_mod import (
-            modify_grub_config,
-            modify_limine_config,  # Add this import
-            modify_refind_config,
-            modify_systemd_boot_config,
+        new_content, needs_change = _DISPATCH[func_name](
+            content, text_to_add, text_to_remove
         )
 
-        # Select the appropriate function based on the parameter
-        if func_name == "systemd_boot":
-            new_content, needs_change = modify_systemd_boot_config(
-                content, text_to_add, text_to_remove
-            )
-        elif func_name == "refind":
-            new_content, needs_change = modify_refind_config(
-                content, text_to_add, text_to_remove
-            )
-        elif func_name == "grub":
-            new_content, needs_change = modify_grub_config(
-                content, text_to_add, text_to_remove
-            )
-        elif func_name == "limine":  # Add this case
-            new_content, needs_change = modify_limine_config(
-                content, text_to_add, text_to_remove
-            )
-        else:
-            raise ValueError(f"Unknown function name: {func_name}")
-
         # Check if change was expected
         assert needs_change is expected_change
         if expected_change:
@@ -194,17 +656,10 @@ class TestBootloaderConfigModification:
                 assert should_contain in new_content
             # If it should not contain content (and this is a removal operation)
             if should_not_contain and text_to_remove:
-                if func_name == "refind":
-                    # For refind, removal might not completely eliminate the content from the entire file
-                    # But it should reduce the count
-                    original_count = content.count(should_not_contain)
-                    new_count = new_content.count(should_not_contain)
-                    assert new_count < original_count
+                if count_before is not None:
+                    assert new_content.count(should_not_contain) < count_before
                 else:
-                    if (
-                        should_not_contain
-                    ):  # Only check if should_not_contain is not empty
-                        assert should_not_contain not in new_content
+                    assert should_not_contain not in new_content
         else:
             # If no change expected, content should remain the same
             assert new_content == content
@@ -214,124 +669,148 @@ class TestBootloaderFileOperations:
     """Test file operation functions"""
 
     @pytest.mark.parametrize(
-        "operation,success_scenario",
+        "operation,success_scenario,exc",
         [
-            ("backup_success", True),
-            ("backup_failure", False),
+            ("backup_success", True, None),
+            ("backup_failure", False, Exception),
+            ("backup_failure", False, OSError),
+            ("backup_failure", False, PermissionError),
         ],
     )
-    def test_create_backup_operations(self, mocker, operation, success_scenario):
+    def test_create_backup_operations(
+        self, mocker, mock_ansible_module, operation, success_scenario, exc
+    ):
         """Test backup creation operations for both success and failure scenarios"""
-        # Create a mock Ansible module using mocker
-        mock_module = mocker.Mock()
-        mock_module.params = {}
-        mock_module.check_mode = False
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-        mock_module.exit_json = mocker.Mock()
-        mock_module.warn = mocker.Mock()
-        mock_module.run_command = mocker.Mock(return_value=(0, "", ""))
-
         # Mock shutil.copy2 using mocker
         mock_copy = mocker.patch("bootloader_mod.shutil.copy2")
 
         if not success_scenario:  # failure scenario
-            mock_copy.side_effect = Exception("Permission denied")
-            with pytest.raises(SystemExit):
-                create_backup(mock_module, "/boot/loader/entries/linux-cachyos.conf")
-            mock_module.fail_json.assert_called_once()
+            mock_copy.side_effect = exc("Permission denied")
+            with pytest.raises(SystemExit, match="Failed to create backup"):
+                create_backup(mock_ansible_module, _SYSTEMD_CONFIG)
         else:  # success scenario
-            config_file = "/boot/loader/entries/linux-cachyos.conf"
-            result = create_backup(mock_module, config_file)
+            config_file = _SYSTEMD_CONFIG
+            result = create_backup(mock_ansible_module, config_file)
             assert result is True
             mock_copy.assert_called_once_with(config_file, config_file + ".bak")
 
     @pytest.mark.parametrize(
-        "operation,success_scenario",
-        [
-            ("write_success", True),
-            ("write_failure", False),
-        ],
+        "patched_open", [IOError("Permission denied")], indirect=True
     )
-    def test_write_config_operations(self, mocker, operation, success_scenario):
-        """Test config writing operations for both success and failure scenarios"""
-        # Create a mock Ansible module using mocker
-        mock_module = mocker.Mock()
-        mock_module.params = {}
-        mock_module.check_mode = False
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-        mock_module.exit_json = mocker.Mock()
-        mock_module.warn = mocker.Mock()
-        mock_module.run_command = mocker.Mock(return_value=(0, "", ""))
-
-        if not success_scenario:  # failure scenario
-            # Mock builtins.open to raise an exception
-            mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-            with pytest.raises(SystemExit):
-                write_config(
-                    mock_module, "/boot/loader/entries/linux-cachyos.conf", "content"
-                )
-        else:  # success scenario
-            # Mock builtins.open using mocker
-            mock_file = mocker.mock_open(
-                read_data="title Arch Linux\nlinux /vmlinuz-linux"
+    def test_write_config_open_failure(self, mock_ansible_module, patched_open):
+        """A failing open reports through fail_json"""
+        with pytest.raises(SystemExit):
+            write_config(
+                mock_ansible_module,
+                _SYSTEMD_CONFIG,
+                "content",
             )
-            mocker.patch("builtins.open", mock_file)
 
-            config_file = "/boot/loader/entries/linux-cachyos.conf"
-            content = "title Arch Linux\nlinux /vmlinuz-linux"
+        assert mock_ansible_module.fail_json.calls == [
+            {"msg": "Failed to write config file: Permission denied"}
+        ]
 
-            result = write_config(mock_module, config_file, content)
-            assert result is True
-            mock_file.assert_called_once_with(config_file, "w")
-            mock_file().write.assert_called_once_with(content)
+    def test_read_file_folds_crlf(self, tmp_path):
+        """_read_file returns text-mode newlines"""
+        config = tmp_path / "grub"
+        config.write_bytes(b'GRUB_TIMEOUT=5\r\nGRUB_CMDLINE_LINUX_DEFAULT="quiet"\r\n')
+        assert _read_file(str(config)) == (
+            'GRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet"\n'
+        )
 
-    def test_create_backup_with_exception_handling(self, mocker):
-        """Test create_backup with exception during backup process"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit(1))
+    def test_write_config_replaces_file(self, mock_ansible_module, tmp_path):
+        """New content is renamed into place with the original file mode"""
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text(_SYSTEMD_BASE)
+        config.chmod(0o600)
+        content = "title Arch Linux\nlinux /vmlinuz-linux"
 
-        # Mock shutil.copy2 to raise an exception
-        mocker.patch(
-            "bootloader_mod.shutil.copy2", side_effect=OSError("Permission denied")
-        )
+        assert write_config(mock_ansible_module, str(config), content) is True
+        assert config.read_text() == content
+        assert config.stat().st_mode & 0o777 == 0o600
+        assert [p.name for p in tmp_path.iterdir()] == ["linux-cachyos.conf"]
 
-        with pytest.raises(SystemExit):
-            create_backup(mock_module, "/test/config/file")
+    def test_write_config_syncs_before_rename(
+        self, mocker, mock_ansible_module, tmp_path
+    ):
+        """The temp file is fsynced before it replaces the config"""
+        calls = []
+        mocker.patch.object(
+            bootloader_mod.os, "fsync", side_effect=lambda fd: calls.append("fsync")
+        )
+        real_replace = bootloader_mod.os.replace
+        mocker.patch.object(
+            bootloader_mod.os,
+            "replace",
+            side_effect=lambda *a: calls.append("replace") or real_replace(*a),
+        )
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text(_SYSTEMD_BASE)
 
-        mock_module.fail_json.assert_called_once()
+        assert write_config(mock_ansible_module, str(config), "content") is True
+        assert calls == ["fsync", "replace"]
 
-    def test_write_config_with_backup_and_ioerror(self, mocker):
-        """Test write_config with backup file provided and IOError occurs"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit(1))
+    @pytest.mark.skipif(os.geteuid() != 0, reason="changing owners needs root")
+    def test_write_config_keeps_owner(self, mock_ansible_module, tmp_path):
+        """The replacement file keeps the original's owner and group"""
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text(_SYSTEMD_BASE)
+        os.chown(config, 1234, 5678)
 
-        # Mock builtins.open to raise IOError
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
+        assert write_config(mock_ansible_module, str(config), "content") is True
+        assert (config.stat().st_uid, config.stat().st_gid) == (1234, 5678)
 
-        # Temporarily mock shutil.move to not fail
-        mocker.patch("bootloader_mod.shutil.move", return_value=None)
+    def test_write_config_writes_utf8(self, mocker, mock_ansible_module, tmp_path):
+        """The temp file is encoded as UTF-8 whatever the locale, like reads"""
+        opened = mocker.patch("bootloader_mod.open", create=True, wraps=open)
+        config = tmp_path / "grub"
+        config.write_text('GRUB_DISTRIBUTOR="Café"\n', encoding="utf-8")
 
-        with pytest.raises(SystemExit):
-            write_config(mock_module, "/test/config", "content", "/test/config.bak")
+        changed, _ = modify_config(
+            mock_ansible_module, "grub", "splash", None, str(config)
+        )
 
-        mock_module.fail_json.assert_called_once()
+        assert changed is True
+        assert opened.call_count == 2  # the read and the temp-file write
+        assert all(c.kwargs.get("encoding") == "utf-8" for c in opened.call_args_list)
+        assert 'GRUB_DISTRIBUTOR="Café"' in config.read_text(encoding="utf-8")
 
-    def test_write_config_with_backup_and_ioerror_and_move_exception(self, mocker):
-        """Test write_config when both write and backup move fail"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit(1))
+    def test_write_config_keeps_symlink(self, mock_ansible_module, tmp_path):
+        """Writing through a symlink updates its target and keeps the link"""
+        real = tmp_path / "real.conf"
+        real.write_text(_SYSTEMD_BASE)
+        link = tmp_path / "linux-cachyos.conf"
+        link.symlink_to(real)
 
-        # Mock builtins.open to raise IOError
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
+        assert write_config(mock_ansible_module, str(link), "content") is True
+        assert link.is_symlink()
+        assert real.read_text() == "content"
 
-        # Mock shutil.move to also raise an exception
-        mocker.patch("bootloader_mod.shutil.move", side_effect=OSError("Move error"))
+    @pytest.mark.parametrize(
+        "target,error",
+        [
+            ("bootloader_mod.shutil.copystat", OSError("Rename failed")),
+            ("bootloader_mod.os.replace", OSError("Rename failed")),
+            (
+                "bootloader_mod.os.fsync",
+                UnicodeEncodeError("ascii", "é", 0, 1, "ordinal not in range"),
+            ),
+        ],
+        ids=["copystat", "replace", "encode"],
+    )
+    def test_write_config_failure_keeps_original(
+        self, mocker, mock_ansible_module, tmp_path, target, error
+    ):
+        """A failure after the temp write leaves the config and no temp file"""
+        mocker.patch(target, side_effect=error)
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text(_SYSTEMD_BASE)
 
-        with pytest.raises(SystemExit):
-            write_config(mock_module, "/test/config", "content", "/test/config.bak")
+        with pytest.raises(SystemExit, match="Failed to write config file"):
+            write_config(mock_ansible_module, str(config), "content")
 
-        mock_module.fail_json.assert_called_once()
+        assert config.read_text() == _SYSTEMD_BASE
+        assert [p.name for p in tmp_path.iterdir()] == ["linux-cachyos.conf"]
 
 
 class TestKernelArgsCheck:
@@ -342,19 +821,19 @@ class TestKernelArgsCheck:
         [
             (
                 "systemd-boot",
-                "title    Arch Linux\nlinux    /vmlinuz-linux\nefi      /EFI/Linux/arch-stable.efi\noptions  root=PARTUUID=12345 ro quiet splash",
+                _SYSTEMD_BASE + " quiet splash",
                 "quiet",
                 True,
             ),
             (
                 "systemd-boot",
-                "title    Arch Linux\nlinux    /vmlinuz-linux\nefi      /EFI/Linux/arch-stable.efi\noptions  root=PARTUUID=12345 ro",
+                _SYSTEMD_BASE,
                 "quiet",
                 False,
             ),
             (
                 "grub",
-                'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"',
+                _GRUB_BASE,
                 "quiet",
                 True,
             ),
@@ -372,7 +851,7 @@ class TestKernelArgsCheck:
             ),
             (
                 "limine",
-                'ESP_PATH="/boot"\nKERNEL_CMDLINE[default]+="quiet nowatchdog splash"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"',
+                _LIMINE_BASE,
                 "quiet",
                 True,
             ),
@@ -386,62 +865,84 @@ class TestKernelArgsCheck:
     )
     def test_check_kernel_args_exist_parametrized(
         self,
-        temp_config_file,
-        mocker,
+        config_for,
         bootloader_type,
         content,
         search_arg,
         should_exist,
     ):
         """Test checking for kernel args in different bootloader configs"""
-        with open(temp_config_file, "w") as f:
-            f.write(content)
-
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
+        mock_module = fake_module()
         result = check_kernel_args_exist(
-            mock_module, bootloader_type, search_arg, temp_config_file
+            mock_module, bootloader_type, search_arg, config_for(content)
         )
         assert result is should_exist
 
+    @pytest.mark.parametrize(
+        "bootloader, file_content, kernel_args, expected, expected_error",
+        [
+            (
+                "unsupported",
+                "options quiet",
+                "quiet",
+                False,
+                "Unsupported bootloader type: unsupported",
+            ),
+            ("systemd-boot", None, "quiet", False, "does not exist"),
+            ("limine", _LIMINE_WITH_MITIGATIONS, "quiet", True, None),
+            ("limine", _LIMINE_WITH_MITIGATIONS, "nonexistent_param", False, None),
+            ("grub", _READ_DATA + "\n# quiet", "quiet", False, None),
+            ("systemd-boot", "title Arch\noptions ro QUIET", "quiet", True, None),
+            (
+                "grub",
+                '#GRUB_CMDLINE_LINUX_DEFAULT="quiet"\n' + _READ_DATA,
+                "quiet",
+                False,
+                None,
+            ),
+        ],
+        ids=[
+            "unsupported",
+            "missing_file",
+            "limine_present",
+            "limine_absent",
+            "grub_outside_cmdline",
+            "systemd_case_insensitive",
+            "grub_commented_out",
+        ],
+    )
+    def test_check_kernel_args_exist(
+        self,
+        config_for,
+        bootloader,
+        file_content,
+        kernel_args,
+        expected,
+        expected_error,
+    ):
+        """check_kernel_args_exist outcomes; file_content None leaves no file"""
+        mock_module = fake_module()
 
-class TestModifyConfig:
-    """Test the main modify_config function"""
-
-    def test_modify_config_no_change_needed(self, mocker):
-        """Test that modify_config returns False when no changes are needed"""
-        # Create a mock Ansible module using mocker
-        mock_module = mocker.Mock()
-        mock_module.params = {}
-        mock_module.check_mode = False
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-        mock_module.exit_json = mocker.Mock()
-        mock_module.warn = mocker.Mock()
-        mock_module.run_command = mocker.Mock(return_value=(0, "", ""))
-
-        # Mock the required functions and methods
-        mock_backup = mocker.patch("bootloader_mod.create_backup")
-        mock_write_config = mocker.patch("bootloader_mod.write_config")
-        mock_file = mocker.mock_open(
-            read_data="title Arch Linux\noptions root=PARTUUID=12345 ro"
+        result = check_kernel_args_exist(
+            mock_module, bootloader, kernel_args, config_for(file_content)
         )
-        mocker.patch("builtins.open", mock_file)
 
-        # Mock os.path.exists
-        def exists_side_effect(path):
-            if path.endswith(".bak"):
-                return False  # Backup file doesn't exist
-            else:
-                return True  # Main config file exists
+        assert result is expected
+        if expected_error is None:
+            mock_module.fail_json.assert_not_called()
+        else:
+            mock_module.fail_json.assert_called_once()
+            assert expected_error in mock_module.fail_json.call_args.kwargs["msg"]
+
 
-        mock_exists = mocker.patch("bootloader_mod.os.path.exists")
-        mock_exists.side_effect = exists_side_effect
-        mock_backup.return_value = True
-        mock_write_config.return_value = True
+class TestModifyConfig:
+    """Test the main modify_config function"""
 
-        # Test with not providing add or remove (no operation requested)
+    def test_modify_config_no_change_needed(self, mock_ansible_module):
+        """Test that modify_config returns False when no changes are needed"""
+        # No operation requested, so it returns before any file access
         changed, message = modify_config(
-            mock_module,
+            mock_ansible_module,
             "systemd-boot",
             text_to_add=None,  # No text to add
             text_to_remove=None,  # No text to remove
@@ -449,1075 +950,249 @@ class TestModifyConfig:
         assert changed is False
         assert "No text to add or remove provided" in message
 
-    def test_modify_config_with_changes(self, mocker):
+    @pytest.mark.parametrize(
+        "patched_read",
+        [_SYSTEMD_SHORT],
+        indirect=True,
+    )
+    def test_modify_config_with_changes(
+        self, mocker, mock_ansible_module, patched_read, fake_exists
+    ):
         """Test that modify_config returns True when changes are made"""
-        # Create a mock Ansible module using mocker
-        mock_module = mocker.Mock()
-        mock_module.params = {}
-        mock_module.check_mode = False
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-        mock_module.exit_json = mocker.Mock()
-        mock_module.warn = mocker.Mock()
-        mock_module.run_command = mocker.Mock(return_value=(0, "", ""))
-
-        # Mock os.path.exists
-        def exists_side_effect(path):
-            if path.endswith(".bak"):
-                return False  # Backup file doesn't exist
-            else:
-                return True  # Main config file exists
-
-        mock_exists = mocker.patch("bootloader_mod.os.path.exists")
-        mock_exists.side_effect = exists_side_effect
-
-        # Mock builtins.open
-        mock_file = mocker.mock_open(
-            read_data="title Arch Linux\noptions root=PARTUUID=12345 ro"
+        patched = mocker.patch.multiple(
+            bootloader_mod, create_backup=mocker.DEFAULT, write_config=mocker.DEFAULT
         )
-        mocker.patch("builtins.open", mock_file)
-
-        # Mock the required functions
-        mocker.patch("bootloader_mod.create_backup", return_value=True)
-        mocker.patch("bootloader_mod.write_config", return_value=True)
+        patched["create_backup"].return_value = True
+        patched["write_config"].return_value = True
 
         changed, message = modify_config(
-            mock_module,
+            mock_ansible_module,
             "systemd-boot",
             text_to_add="quiet",  # New option
             text_to_remove=None,
         )
         assert changed is True
         assert "Updated systemd-boot configuration" in message
+        patched["write_config"].assert_called_once_with(
+            mock_ansible_module, _SYSTEMD_CONFIG, _SYSTEMD_SHORT + " quiet"
+        )
 
-    def test_modify_config_missing_config_file(self, mocker):
-        """Test that modify_config fails when config file doesn't exist"""
-        # Create a mock Ansible module using mocker
-        mock_module = mocker.Mock()
-        mock_module.params = {}
-        mock_module.check_mode = False
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-        mock_module.exit_json = mocker.Mock()
-        mock_module.warn = mocker.Mock()
-        mock_module.run_command = mocker.Mock(return_value=(0, "", ""))
-
-        # Mock os.path.exists to return False (file doesn't exist)
-        mocker.patch("bootloader_mod.os.path.exists", return_value=False)
-
-        with pytest.raises(SystemExit):
-            modify_config(
-                mock_module, "systemd-boot", text_to_add="quiet", text_to_remove=None
-            )
-        mock_module.fail_json.assert_called_once()
-
+    @pytest.mark.parametrize(
+        "content,text_to_remove,expected_changed",
+        [
+            ('GRUB_CMDLINE_LINUX_DEFAULT="quiet  splash"\n', "quiet splash", True),
+            ('# quiet\nGRUB_CMDLINE_LINUX_DEFAULT="splash"\n', "quiet", False),
+            ('GRUB_CMDLINE_LINUX_DEFAULT="quietly"\n', "quiet", False),
+        ],
+        ids=["spacing_differs", "only_in_comment", "inside_longer_token"],
+    )
+    def test_modify_config_removal_follows_modifier(
+        self, mock_ansible_module, tmp_path, content, text_to_remove, expected_changed
+    ):
+        """Removal results come from the modifier's token match, not a substring"""
+        config = tmp_path / "grub"
+        config.write_text(content)
 
-class TestBootloaderModuleIntegration:
-    """Integration tests for the bootloader module"""
+        changed, _ = modify_config(
+            mock_ansible_module, "grub", None, text_to_remove, str(config)
+        )
 
-    def test_bootloader_module_integration(self):
-        """Test bootloader module integration"""
-        # Verify the module can be imported and has the expected structure
-        from bootloader_mod import main as bootloader_main
+        assert changed is expected_changed
+        assert (tmp_path / "grub.bak").exists() is expected_changed
 
-        assert callable(bootloader_main)
+    def test_modify_config_non_utf8_config(self, mock_ansible_module, tmp_path):
+        """A config that is not UTF-8 is reported through fail_json"""
+        config = tmp_path / "grub"
+        config.write_bytes(b'GRUB_CMDLINE_LINUX_DEFAULT="quiet \xff"\n')
 
-        # Verify the expected functions exist
-        from bootloader_mod import detect_bootloader, modify_config
+        with pytest.raises(SystemExit, match="Failed to read config file"):
+            modify_config(mock_ansible_module, "grub", "splash", None, str(config))
 
-        assert callable(detect_bootloader)
-        assert callable(modify_config)
+    def test_modify_config_missing_config_file(self, mock_ansible_module, tmp_path):
+        """Test that modify_config fails when config file doesn't exist"""
+        with pytest.raises(SystemExit, match="linux-cachyos.conf does not exist"):
+            modify_config(
+                mock_ansible_module,
+                "systemd-boot",
+                text_to_add="quiet",
+                text_to_remove=None,
+                config_file=str(tmp_path / "linux-cachyos.conf"),
+            )
 
 
 class TestMissingCoverage:
     """Test cases to cover previously untested functionality"""
 
-    def test_modify_limine_config_complex_add(self):
-        """Test complex Limine config modification - adding to existing line"""
-        content = 'ESP_PATH="/boot"\nKERNEL_CMDLINE[default]+="quiet nowatchdog splash"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"'
-        new_content, needs_change = modify_limine_config(
-            content, "intel_pstate=enable", None
-        )
-        assert "intel_pstate=enable" in new_content
-        assert needs_change is True
+    @pytest.mark.parametrize(
+        "func, content, add, remove, must_contain, must_not_contain, expected_change",
+        _VARIANT_CASES,
+        ids=_VARIANT_IDS,
+    )
+    def test_modify_config_variants(
+        self,
+        func,
+        content,
+        add,
+        remove,
+        must_contain,
+        must_not_contain,
+        expected_change,
+    ):
+        """Pure-function modifier edge cases, one row per former standalone test"""
+        new_content, needs_change = _DISPATCH[func](content, add, remove)
+        assert needs_change is expected_change
+        _assert_params(new_content, must_contain, must_not_contain)
 
-    def test_modify_limine_config_complex_remove(self):
-        """Test complex Limine config modification - removing from existing line"""
-        content = 'ESP_PATH="/boot"\nKERNEL_CMDLINE[default]+="quiet nowatchdog splash mitigations=auto"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"'
-        new_content, needs_change = modify_limine_config(
-            content, None, "mitigations=auto"
-        )
-        assert "mitigations=auto" not in new_content
-        assert "quiet nowatchdog splash" in new_content  # Other params should remain
-        assert needs_change is True
+    def test_modify_config_with_ioerror_reading_file(self, mocker, tmp_path):
+        """Test modify_config when reading the config file fails"""
+        mock_module = fake_module()
 
-    def test_modify_limine_config_add_when_no_line_exists(self):
-        """Test adding Limine config when no cmdline line exists"""
-        content = (
-            'ESP_PATH="/boot"\nBOOT_ORDER="*, *lts, *fallback, Snapshots"\nTIMEOUT=2'
-        )
-        new_content, needs_change = modify_limine_config(
-            content, "newparam=value", None
+        # A directory is not missing, so open() raises IsADirectoryError and
+        # lands in the generic read-error branch
+        changed, message = modify_config(
+            mock_module, "systemd-boot", "test", None, str(tmp_path)
         )
-        assert "newparam=value" in new_content
-        assert needs_change is True
 
-    def test_modify_refind_config_complex_logic(self, temp_config_file, mocker):
-        """Test complex refind config modification logic"""
-        content = '"Boot with standard options" "root=PARTUUID=12345 ro quiet"\n"Boot with fallback initramfs" "root=PARTUUID=12345 ro initramfs-linux-fallback.img"'
-        new_content, needs_change = modify_refind_config(content, "newparam", "quiet")
-        assert "newparam" in new_content
-        assert "quiet" not in new_content or new_content.count("quiet") < content.count(
-            "quiet"
-        )
-        assert needs_change is True
+        assert changed is False
+        assert "Failed to read config file" in message
+        mock_module.fail_json.assert_called_once()
 
-    def test_modify_systemd_boot_config_add_to_options_line(self):
-        """Test adding to an existing options line in systemd-boot config"""
-        content = "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi\noptions root=PARTUUID=12345 ro"
-        new_content, needs_change = modify_systemd_boot_config(content, "quiet", None)
-        assert "quiet" in new_content
-        assert needs_change is True
-        # Verify that it properly adds to existing options line
-        assert "root=PARTUUID=12345 ro quiet" in new_content
+    def test_modify_config_with_unsupported_bootloader_type(self, mocker):
+        """Test modify_config with unsupported bootloader type"""
+        mock_module = fake_module()
 
-    def test_modify_systemd_boot_config_remove_with_regex_edge_case(self):
-        """Test systemd-boot config removal with edge case regex matching"""
-        content = "title Arch Linux\noptions quiet splash test=123 test=456"
-        new_content, needs_change = modify_systemd_boot_config(
-            content, None, "test=123"
+        # For unsupported bootloader type, the error occurs during config path lookup
+        # but since "unsupported_type" isn't a valid type in the config_files dict,
+        # get_bootloader_config will return None, triggering the "Could not determine config file path" message
+        # This is the actual expected behavior from the code
+        changed, message = modify_config(
+            mock_module, "unsupported_type", text_to_add="test", text_to_remove=None
         )
-        # Should remove only test=123, not test=456
-        assert "test=123" not in new_content
-        assert "test=456" in new_content
-        assert needs_change is True
+        assert changed is False
+        assert (
+            "Could not determine config file path" in message
+        )  # This is the actual error message
 
-    def test_modify_systemd_boot_config_remove_boundary_check(self):
-        """Test systemd-boot config removal with boundary checking"""
-        content = "title Arch Linux\noptions quiet splash test_value"
-        new_content, needs_change = modify_systemd_boot_config(content, None, "test")
-        # Should not remove "test_value" when trying to remove "test" (boundary check)
-        assert "test_value" in new_content
-        assert needs_change is False  # No change should occur
-
-    def test_modify_systemd_boot_config_no_options_line(self):
-        """Test adding options when there's no existing options line"""
-        content = (
-            "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi"
-        )
-        new_content, needs_change = modify_systemd_boot_config(content, "quiet", None)
-        assert "quiet" in new_content
-        assert needs_change is True
-        assert "options quiet" in new_content
+    def test_modify_config_with_backup_file_already_exists(self, mocker, tmp_path):
+        """Test modify_config when backup file already exists"""
+        mock_module = fake_module()
+        mock_module.fail_json = FailJson()
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text(_SYSTEMD_BASE)
+        (tmp_path / "linux-cachyos.conf.bak").write_text(_SYSTEMD_BASE)
 
-    def test_modify_grub_config_with_special_characters(self):
-        """Test GRUB config modification with special characters in parameters"""
-        content = (
-            'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"'
-        )
-        new_content, needs_change = modify_grub_config(
-            content, "param_with=equals=signs", None
-        )
-        assert "param_with=equals=signs" in new_content
-        assert needs_change is True
+        with pytest.raises(SystemExit):
+            modify_config(mock_module, "systemd-boot", "test", None, str(config))
+        assert mock_module.fail_json.calls == [
+            {
+                "msg": f"Backup file {config}.bak already exists. "
+                "Please remove it to proceed."
+            }
+        ]
+        assert config.read_text() == _SYSTEMD_BASE
+
+    def test_modify_config_with_check_mode(self, mocker, tmp_path):
+        """Test modify_config in check mode"""
+        mock_module = fake_module()
+        mock_module.check_mode = True  # Set check mode to True
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text(_SYSTEMD_BASE)
 
-    def test_modify_grub_config_remove_special_chars(self):
-        """Test GRUB config removal with special characters in parameters"""
-        content = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash param_to_remove=123"'
-        new_content, needs_change = modify_grub_config(
-            content, None, "param_to_remove=123"
+        changed, message = modify_config(
+            mock_module,
+            "systemd-boot",
+            text_to_add="quiet",  # This will trigger a change
+            text_to_remove=None,
+            config_file=str(config),
         )
-        assert "param_to_remove=123" not in new_content
-        assert needs_change is True
+        assert changed is True  # Would make a change in check mode
+        assert "Would update" in message
+        assert config.read_text() == _SYSTEMD_BASE
+        assert not (tmp_path / "linux-cachyos.conf.bak").exists()
 
-    def test_modify_refind_config_edge_case_single_quote_handling(self):
-        """Test refind config modification edge case with specific quote handling"""
-        # This content has a quoted parameter that requires careful handling
-        content = '"Boot with standard options" "root=PARTUUID=12345 ro quiet splash"'
-        new_content, needs_change = modify_refind_config(content, "newparam", "quiet")
-        # The function should properly handle the quote reconstruction
-        assert needs_change is True
-        # Check that both changes happened - removal of quiet and addition of newparam
-        # May be in first matched line
-        assert "newparam" in new_content
-
-    def test_modify_refind_config_empty_params_addition(self):
-        """Test refind config modification when adding to empty parameters"""
-        content = (
-            '"Boot with standard options" ""\n"Boot with params" "root=PARTUUID=test"'
+    def test_modify_config_grub_with_config_file(self, mocker, tmp_path):
+        """Test modify_config with GRUB and config file"""
+        mock_module = fake_module()
+        config = tmp_path / "grub"
+        config.write_text(_READ_DATA)
+
+        changed, message = modify_config(
+            mock_module,
+            "grub",
+            text_to_add="quiet",
+            text_to_remove=None,
+            config_file=str(config),
         )
-        new_content, needs_change = modify_refind_config(content, "newparam", None)
-        assert "newparam" in new_content
-        assert needs_change is True
+        assert changed is True
+        assert 'GRUB_CMDLINE_LINUX_DEFAULT="splash quiet"' in config.read_text()
+        assert (tmp_path / "grub.bak").read_text() == _READ_DATA
 
-    def test_modify_grub_config_regex_replacement_edge_cases(self):
-        """Test edge cases in GRUB config regex replacement logic"""
-        # Test the specific replace_or_add_grub_cmdline path
-        content = 'GRUB_CMDLINE_LINUX="existing_param"\nGRUB_TIMEOUT=5'
-        new_content, needs_change = modify_grub_config(content, "new_param", None)
-        assert "new_param" in new_content
-        assert needs_change is True
+    def test_safe_path_exists_with_stopiteration(self, mocker):
+        """Test the safe_path_exists function handling StopIteration exception"""
+        mocker.patch.object(_OS_PATH, "exists", side_effect=StopIteration())
 
-    def test_modify_grub_config_remove_from_complex_line(self):
-        """Test removing parameter from complex GRUB command line"""
-        content = 'GRUB_CMDLINE_LINUX_DEFAULT="quiet splash mitigations=auto intel_pstate=disable"'
-        new_content, needs_change = modify_grub_config(
-            content, None, "mitigations=auto"
-        )
-        assert "mitigations=auto" not in new_content
-        assert "quiet splash" in new_content  # Other params should remain
-        assert needs_change is True
+        # This should not raise an exception and should return False
+        result = safe_path_exists("/some/path")
+        assert result is False
 
-    def test_modify_grub_config_multiple_lines(self):
-        """Test GRUB config modification with multiple cmdline lines"""
-        content = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX="quiet splash"\nGRUB_CMDLINE_LINUX_DEFAULT="intel_pstate=enable"'
-        new_content, needs_change = modify_grub_config(content, "new_param", "quiet")
-        assert "new_param" in new_content
-        assert needs_change is True
-        # The quiet parameter should be removed from the line it was originally in
-        # Checking that the quiet parameter is no longer in the content (at least in the expected way)
-        # Looking at the actual result from the previous test, it seems quiet is not being removed properly
-        # It may be keeping quiet and adding new_param, resulting in "quiet splash new_param"
-        # Let's just verify that both operations happened: removal of quiet and addition of new_param
-        # The exact implementation may depend on the modify_grub_config function behavior
-
-    def test_modify_refind_config_multiple_entries(self):
-        """Test refind config modification with multiple entries"""
-        content = '"Boot with standard options" "root=PARTUUID=12345 ro quiet splash"\n"Boot with fallback" "root=PARTUUID=12345 ro quiet"'
-        new_content, needs_change = modify_refind_config(content, "newparam", "splash")
-        # Only the first matching line should be modified for removal
-        assert "newparam" in new_content
-        assert needs_change is True
 
-    def test_write_config_with_backup_file(self, mocker):
-        """Test write_config function with backup file provided"""
-        mock_module = mocker.Mock()
+class TestCommonOperations:
+    """Test common operations using shared fixtures"""
 
-        # Mock open to work properly
-        mock_file = mocker.mock_open()
-        mocker.patch("builtins.open", mock_file)
+    @pytest.mark.parametrize(
+        "file_content",
+        [
+            "title Arch Linux\nlinux /vmlinuz-linux",
+            "title Test\noptions quiet splash",
+            "",  # empty content
+        ],
+    )
+    def test_write_config_various_content(
+        self, mock_ansible_module, tmp_path, file_content
+    ):
+        """Test config writing with various content types"""
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text(_SYSTEMD_BASE)
 
-        result = write_config(
-            mock_module, "/test/config", "test content", "/test/config.bak"
-        )
+        result = write_config(mock_ansible_module, str(config), file_content)
         assert result is True
-        mock_file.assert_called_once_with("/test/config", "w")
-        mock_file().write.assert_called_once_with("test content")
+        assert config.read_text() == file_content
 
-    def test_create_backup_with_exception(self, mocker):
-        """Test create_backup function when shutil.copy2 raises an exception"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
+    def test_modify_config_with_unsupported_bootloader(self, mocker):
+        """Test modify_config with unsupported bootloader type"""
+        mock_module = fake_module()
+        mock_module.fail_json = FailJson()
 
-        # Mock shutil.copy2 to raise an exception
-        mock_copy = mocker.patch("bootloader_mod.shutil.copy2")
-        mock_copy.side_effect = PermissionError("Permission denied")
+        with pytest.raises(SystemExit, match="Could not determine config file path"):
+            modify_config(
+                mock_module, "unsupported_type", text_to_add="test", text_to_remove=None
+            )
 
-        with pytest.raises(SystemExit):
-            create_backup(mock_module, "/nonexistent/config")
-
-        mock_module.fail_json.assert_called_once()
-
-    def test_check_kernel_args_exist_with_unsupported_bootloader(self, mocker):
-        """Test check_kernel_args_exist with unsupported bootloader"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-        result = check_kernel_args_exist(
-            mock_module, "unsupported", "test_param", "/fake/path"
-        )
-        assert result is False
-        mock_module.fail_json.assert_called_once()
-
-    def test_main_function_with_detect_only(self, mocker):
-        """Test main function with detect_only parameter"""
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": None,
-            "text_to_remove": None,
-            "detect_only": True,
-            "check_args": None,
-            "bootloader": "auto",
-            "config_file": None,
-        }
-        mock_module.exit_json = mocker.Mock()
-
-        # Instead of calling main() directly, test the logical flow
-        # Mock detect_bootloader
-        mocker.patch("bootloader_mod.detect_bootloader", return_value="systemd-boot")
-        mocker.patch(
-            "bootloader_mod.get_bootloader_config",
-            return_value="/boot/loader/entries/linux-cachyos.conf",
-        )
-
-        # Simulate what the main function does when detect_only is True
-        bootloader_type = "systemd-boot"  # Simulated from detect_bootloader
-        config_file = "/boot/loader/entries/linux-cachyos.conf"  # Simulated from get_bootloader_config
-
-        # The main function would call module.exit_json with these parameters when detect_only=True
-        mock_module.exit_json.assert_not_called()  # Not called yet, we're just simulating
-
-        # Actually call exit_json to simulate main behavior
-        mock_module.exit_json(
-            changed=False,
-            bootloader_type=bootloader_type,
-            config_file=config_file,
-        )
-
-        # Verify exit_json was called
-        assert mock_module.exit_json.called
-
-    def test_main_function_with_args_check(self, mocker):
-        """Test main function with check_args parameter"""
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": None,
-            "text_to_remove": None,
-            "detect_only": False,
-            "check_args": "test_arg",
-            "bootloader": "systemd-boot",
-            "config_file": None,
-        }
-        mock_module.exit_json = mocker.Mock()
-
-        # Mock check_kernel_args_exist
-        mocker.patch("bootloader_mod.check_kernel_args_exist", return_value=True)
-        mocker.patch(
-            "bootloader_mod.get_bootloader_config",
-            return_value="/boot/loader/entries/linux-cachyos.conf",
-        )
-
-        # Test the logical flow when check_args is provided
-        # Simulate the main function behavior without calling the actual main()
-        bootloader_type = "systemd-boot"
-        config_file = "/boot/loader/entries/linux-cachyos.conf"
-        args_exist = True  # Simulated from check_kernel_args_exist
-
-        # Call exit_json as main() would when check_args is provided
-        mock_module.exit_json(
-            changed=False,
-            bootloader_type=bootloader_type,
-            config_file=config_file,
-            args_exist=args_exist,
-        )
-
-        # Verify exit_json was called (though not with exactly one call due to our manual call)
-        assert mock_module.exit_json.called
-
-    def test_write_config_with_ioerror_and_backup(self, mocker):
-        """Test write_config when IOError occurs and backup exists"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock open to raise IOError
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-        # Mock shutil.move to succeed
-        mock_move = mocker.patch("bootloader_mod.shutil.move")
-
-        with pytest.raises(SystemExit):
-            write_config(
-                mock_module, "/test/config", "test content", "/test/config.bak.backup"
-            )
-
-        # Verify that shutil.move was called to restore the backup
-        mock_move.assert_called()
-
-    def test_main_function_with_no_supported_bootloader(self, mocker):
-        """Test main function when no supported bootloader is detected"""
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": "test_param",
-            "text_to_remove": None,
-            "detect_only": False,
-            "check_args": None,
-            "bootloader": "auto",  # Will trigger detect_bootloader
-            "config_file": None,
-        }
-
-        # Mock AnsibleModule to return our mock
-        mocker.patch("bootloader_mod.AnsibleModule", return_value=mock_module)
-
-        # Mock detect_bootloader to return "none"
-        mocker.patch("bootloader_mod.detect_bootloader", return_value="none")
-
-        # Mock module.fail_json to check that it's called
-        mock_module.fail_json = mocker.Mock()
-
-        # Import and call main to trigger the "none" bootloader detection path
-        from bootloader_mod import main
-
-        try:
-            main()
-        except SystemExit:
-            pass  # Expected since fail_json calls exit
-
-        # Verify fail_json was called with the appropriate message
-        mock_module.fail_json.assert_called_once()
-        # Check the call arguments to ensure the error message is correct
-        args, kwargs = mock_module.fail_json.call_args
-        msg = args[0] if args else kwargs.get("msg", "")
-        assert "No supported bootloader detected" in msg
-
-    def test_modify_grub_config_with_no_match_add_path(self):
-        """Test the add path in modify_grub_config when no existing line matches"""
-        content = "GRUB_DEFAULT=0\nGRUB_TIMEOUT=5"  # No GRUB_CMDLINE_LINUX lines
-        new_content, needs_change = modify_grub_config(content, "newparam", None)
-        # This should trigger the path where no existing line is found and a new one is added
-        assert "newparam" in new_content
+    def test_modify_refind_config_keeps_following_lines(self):
+        """Only the first entry changes and its line ending survives"""
+        content = '"Boot" "ro quiet"\n"Fallback" "ro quiet"\n'
+        new_content, needs_change = modify_refind_config(content, "splash", "quiet")
+        assert new_content == '"Boot" "ro splash"\n"Fallback" "ro quiet"\n'
         assert needs_change is True
 
-    def test_modify_config_with_ioerror_reading_file(self, mocker):
-        """Test modify_config when reading the config file fails"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        # Mock os.path.exists to return True for main file but False for backup file
-        def exists_side_effect(path):
-            if path.endswith(".bak"):
-                return False  # backup file doesn't exist
-            else:
-                return True  # main config file exists
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-
-        # Mock open to raise IOError when reading
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-        from bootloader_mod import modify_config
-
-        changed, message = modify_config(
-            mock_module, "systemd-boot", text_to_add="test", text_to_remove=None
-        )
-
-        assert changed is False
-        assert "Failed to read config file" in str(
-            message
-        )  # Changed to str() to handle potential tuple
-
-    def test_modify_config_with_unsupported_bootloader_type(self, mocker):
-        """Test modify_config with unsupported bootloader type"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        # For unsupported bootloader type, the error occurs during config path lookup
-        # but since "unsupported_type" isn't a valid type in the config_files dict,
-        # get_bootloader_config will return None, triggering the "Could not determine config file path" message
-        # This is the actual expected behavior from the code
-        changed, message = modify_config(
-            mock_module, "unsupported_type", text_to_add="test", text_to_remove=None
-        )
-        assert changed is False
-        assert (
-            "Could not determine config file path" in message
-        )  # This is the actual error message
-
-    def test_modify_config_with_backup_file_already_exists(self, mocker):
-        """Test modify_config when backup file already exists"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        # Mock os.path.exists to return True for the backup file
-        def exists_side_effect(path):
-            if path.endswith(".bak"):
-                return True  # Backup file exists
-            else:
-                return True  # Main config file exists
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-
-        changed, message = modify_config(
-            mock_module, "systemd-boot", text_to_add="test", text_to_remove=None
-        )
-        assert changed is False
-        assert "Backup file" in message and "already exists" in message
-
-    def test_modify_config_with_check_mode(self, mocker):
-        """Test modify_config in check mode"""
-        mock_module = mocker.Mock()
-        mock_module.check_mode = True  # Set check mode to True
-
-        # Mock os.path.exists to return True for both config file and backup file should not exist
-        def exists_side_effect(path):
-            if path.endswith(".bak"):
-                return False  # Backup file doesn't exist
-            else:
-                return True  # Main config file exists
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-
-        # Mock open to work properly
-        mock_file = mocker.mock_open(
-            read_data="title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi\noptions root=PARTUUID=12345 ro"
-        )
-        mocker.patch("builtins.open", mock_file)
-
-        changed, message = modify_config(
-            mock_module,
-            "systemd-boot",
-            text_to_add="quiet",  # This will trigger a change
-            text_to_remove=None,
-        )
-        assert changed is True  # Would make a change in check mode
-        assert "Would update" in message
-
-    def test_modify_config_grub_with_config_file(self, mocker):
-        """Test modify_config with GRUB and config file"""
-        mock_module = mocker.Mock()
-        mock_module.check_mode = False
-
-        # Mock os.path.exists to return True (file exists)
-        def exists_side_effect(path):
-            if path.endswith(".bak"):
-                return False  # Backup file doesn't exist
-            else:
-                return True  # Main config file exists
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-
-        # Mock open to work properly
-        mock_file = mocker.mock_open(
-            read_data='GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="splash"'
-        )
-        mocker.patch("builtins.open", mock_file)
-
-        # Mock backup and write functions
-        _mock_backup = mocker.patch("bootloader_mod.create_backup", return_value=True)
-        _mock_write = mocker.patch("bootloader_mod.write_config", return_value=True)
-
-        changed, message = modify_config(
-            mock_module,
-            "grub",
-            text_to_add="quiet",
-            text_to_remove=None,
-            config_file="/boot/grub/grub.cfg",
-        )
-        assert changed is True
-
-    def test_modify_systemd_boot_config_remove_only(self):
-        """Test removing parameter from systemd-boot config without adding"""
-        content = "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi\noptions root=PARTUUID=12345 ro quiet"
-        new_content, needs_change = modify_systemd_boot_config(content, None, "quiet")
-        assert "quiet" not in new_content
-        assert needs_change is True
-        # Make sure other parameters remain
-        assert "root=PARTUUID=12345" in new_content
-        assert "ro" in new_content
-
-    def test_modify_systemd_boot_config_add_and_remove(self):
-        """Test adding and removing parameters simultaneously in systemd-boot config"""
-        content = "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi\noptions root=PARTUUID=12345 ro quiet"
+    def test_modify_systemd_boot_config_edits_only_options_line(self):
+        """Other keys are left alone even when they contain the parameter"""
+        content = "title quiet\noptions ro quiet\nlinux /vmlinuz-linux\n"
         new_content, needs_change = modify_systemd_boot_config(
             content, "splash", "quiet"
         )
-        assert "quiet" not in new_content
-        assert "splash" in new_content
+        assert new_content == "title quiet\noptions ro splash\nlinux /vmlinuz-linux\n"
         assert needs_change is True
 
-    def test_modify_refind_config_remove_only(self):
-        """Test removing parameter from refind config without adding"""
-        content = '"Boot with standard options" "root=PARTUUID=12345 ro quiet splash"'
-        new_content, needs_change = modify_refind_config(content, None, "quiet")
-        assert needs_change is True
-        # Should still have other parameters but not 'quiet'
-        assert "root=PARTUUID=12345" in new_content
-        assert "ro" in new_content
-        # Check that 'quiet' is not in the params
-
-    def test_modify_grub_config_add_and_remove(self):
-        """Test adding and removing parameters simultaneously in GRUB config"""
-        content = (
-            'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"'
-        )
-        new_content, needs_change = modify_grub_config(
-            content, "intel_pstate=enable", "quiet"
-        )
-        # The removal might not work as expected in all cases, but we check that it at least does the add
-        assert "intel_pstate=enable" in new_content
-        assert needs_change is True
-
-    def test_modify_grub_config_remove_only(self):
-        """Test removing parameter from GRUB config without adding"""
-        content = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash mitigations=auto"'
-        new_content, needs_change = modify_grub_config(
-            content, None, "mitigations=auto"
-        )
-        assert "mitigations=auto" not in new_content
-        assert "quiet splash" in new_content  # Other params should remain
-        assert needs_change is True
-
-    def test_create_backup_with_exception_handling(self, mocker):
-        """Test create_backup function when shutil.copy2 raises an exception"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock shutil.copy2 to raise an exception
-        mock_copy = mocker.patch("bootloader_mod.shutil.copy2")
-        mock_copy.side_effect = PermissionError("Permission denied")
-
-        from bootloader_mod import create_backup
-
-        with pytest.raises(SystemExit):
-            create_backup(mock_module, "/nonexistent/config")
-
-        mock_module.fail_json.assert_called_once()
-
-    def test_write_config_with_backup_and_ioerror(self, mocker):
-        """Test write_config when writing fails and backup restoration is needed"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock open to raise IOError
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-        # Mock shutil.move to succeed
-        mock_move = mocker.patch("bootloader_mod.shutil.move")
-
-        from bootloader_mod import write_config
-
-        with pytest.raises(SystemExit):
-            write_config(
-                mock_module, "/test/config", "test content", "/test/config.bak"
-            )
-
-        # Verify that shutil.move was called to restore the backup
-        mock_move.assert_called()
-
-    def test_check_kernel_args_exist_unsupported_bootloader(self, mocker):
-        """Test check_kernel_args_exist with unsupported bootloader"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-        mock_module.params = {"config_file": None}
-
-        from bootloader_mod import check_kernel_args_exist
-
-        result = check_kernel_args_exist(
-            mock_module, "unsupported", "test_param", "/fake/path"
-        )
-        assert result is False
-        mock_module.fail_json.assert_called_once()
-
-    def test_modify_systemd_boot_config_with_empty_content(self):
-        """Test modify_systemd_boot_config with empty content"""
-        new_content, needs_change = modify_systemd_boot_config("", "quiet", None)
-        # Should add options line when no options exist
-        assert "quiet" in new_content
-        assert needs_change is True
-
-    def test_modify_grub_config_with_no_cmdline_vars(self):
-        """Test modify_grub_config when there are no existing cmdline lines"""
-        content = (
-            "GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_THEME=/boot/grub/themes/Arc/theme.txt"
-        )
-        new_content, needs_change = modify_grub_config(content, "quiet", None)
-        assert "quiet" in new_content
-        assert needs_change is True
-
-    def test_check_kernel_args_exist_missing_config_file(self, mocker):
-        """Test check_kernel_args_exist when config file doesn't exist"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        # Mock os.path.exists to return False
-        mocker.patch("bootloader_mod.os.path.exists", return_value=False)
-
-        from bootloader_mod import check_kernel_args_exist
-
-        result = check_kernel_args_exist(
-            mock_module, "systemd-boot", "test_param", "/nonexistent/path"
-        )
-        assert result is False
-        mock_module.fail_json.assert_called_once()
-
-    def test_modify_config_with_exception_in_reading_file(self, mocker):
-        """Test modify_config when reading the config file produces an exception"""
-
-        # Mock os.path.exists to return True for main file but False for backup
-        def exists_side_effect(path):
-            if path.endswith(".bak"):
-                return False
-            else:
-                return True
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-
-        # Mock open to raise an exception when trying to read
-        mocker.patch("builtins.open", side_effect=PermissionError("Permission denied"))
-
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        from bootloader_mod import modify_config
-
-        changed, message = modify_config(
-            mock_module, "systemd-boot", text_to_add="test", text_to_remove=None
-        )
-        assert changed is False
-        mock_module.fail_json.assert_called_once()
-
-    def test_modify_systemd_boot_config_with_regex_edge_cases(self):
-        """Test modify_systemd_boot_config with regex edge cases"""
-        # Test with text that could be problematic for regex
-        content = "title Test\noptions test_value other_test_value"
-        # Should not remove 'test_value' when trying to remove 'test' (boundary check)
-        new_content, needs_change = modify_systemd_boot_config(content, None, "test")
-        assert "test_value" in new_content
-        assert needs_change is False  # No change should occur due to boundary check
-
-    def test_modify_grub_config_with_multiline_cmdline(self):
-        """Test modify_grub_config with complex multiline content"""
-        content = 'GRUB_DEFAULT=0\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"\nGRUB_CMDLINE_LINUX="systemd.debug"\nGRUB_TIMEOUT=5'
-        new_content, needs_change = modify_grub_config(
-            content, "intel_pstate=enable", "quiet"
-        )
-        assert "intel_pstate=enable" in new_content
-        assert needs_change is True
-
-    def test_modify_limine_config_add_parameter(self):
-        """Test modify_limine_config adding a parameter"""
-        content = 'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash"'
-        new_content, needs_change = modify_limine_config(
-            content, "intel_pstate=enable", None
-        )
-        assert "intel_pstate=enable" in new_content
-        assert needs_change is True
-
-    def test_modify_limine_config_remove_parameter(self):
-        """Test modify_limine_config removing a parameter"""
-        content = 'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash mitigations=auto"'
-        new_content, needs_change = modify_limine_config(
-            content, None, "mitigations=auto"
-        )
-        assert "mitigations=auto" not in new_content
-        assert needs_change is True
-
-    def test_modify_limine_config_add_and_remove_parameter(self):
-        """Test modify_limine_config adding and removing parameters"""
-        content = 'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash"'
-        new_content, needs_change = modify_limine_config(
-            content, "intel_pstate=enable", "quiet"
-        )
-        assert "intel_pstate=enable" in new_content
-        assert "quiet" not in new_content
-        assert needs_change is True
-
-    def test_modify_limine_config_no_change_needed(self):
-        """Test modify_limine_config when no changes are needed"""
-        content = 'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash"'
-        new_content, needs_change = modify_limine_config(content, None, "nonexistent")
-        assert new_content == content
-        assert needs_change is False
-
-    def test_check_kernel_args_exist_with_limine_bootloader(self, mocker):
-        """Test check_kernel_args_exist function with Limine bootloader"""
-        mock_module = mocker.Mock()
-
-        # Mock os.path.exists to return True for limine config file
-        mocker.patch("bootloader_mod.os.path.exists", return_value=True)
-
-        # Create a temporary file with limine config content
-        with open("/tmp/test_limine.conf", "w") as f:
-            f.write(
-                'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash mitigations=auto"\n'
-            )
-
-        # Update the mock to handle specific file path
-        def mock_exists(path):
-            return path == "/tmp/test_limine.conf"
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=mock_exists)
-
-        # Mock file reading
-        mocker.patch(
-            "builtins.open",
-            mocker.mock_open(
-                read_data='TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash mitigations=auto"\n'
-            ),
-        )
-
-        from bootloader_mod import check_kernel_args_exist
-
-        # Test positive case
-        result = check_kernel_args_exist(
-            mock_module, "limine", "quiet", "/tmp/test_limine.conf"
-        )
-        assert result is True
-
-        # Test negative case
-        result = check_kernel_args_exist(
-            mock_module, "limine", "nonexistent_param", "/tmp/test_limine.conf"
-        )
-        assert result is False
-
-    def test_safe_path_exists_with_stopiteration(self, mocker):
-        """Test the safe_path_exists function handling StopIteration exception"""
-        # Create a mock os.path.exists that raises StopIteration
-        mock_exists = mocker.Mock()
-        mock_exists.side_effect = StopIteration()
-        mocker.patch("bootloader_mod.os.path", mocker.Mock())
-        mocker.patch("bootloader_mod.os.path.exists", mock_exists)
-
-        from bootloader_mod import safe_path_exists
-
-        # This should not raise an exception and should return False
-        result = safe_path_exists("/some/path")
-        assert result is False
-
-
-class TestCommonOperations:
-    """Test common operations using shared fixtures"""
-
-    @pytest.mark.parametrize(
-        "file_content",
-        [
-            "title Arch Linux\nlinux /vmlinuz-linux",
-            "title Test\noptions quiet splash",
-            "",  # empty content
-        ],
-    )
-    def test_write_config_various_content(
-        self, mocker, mock_ansible_module, file_content
-    ):
-        """Test config writing with various content types using shared fixture"""
-        # Mock builtins.open using mocker
-        mock_file = mocker.mock_open(read_data=file_content)
-        mocker.patch("builtins.open", mock_file)
-
-        config_file = "/boot/loader/entries/linux-cachyos.conf"
-
-        result = write_config(mock_ansible_module, config_file, file_content)
-        assert result is True
-        mock_file.assert_called_once_with(config_file, "w")
-        mock_file().write.assert_called_once_with(file_content)
-
-    def test_write_config_failure_with_shared_fixture(
-        self, mocker, mock_ansible_module
-    ):
-        """Test that config writing handles exceptions properly using shared fixture"""
-        # Mock builtins.open to raise an exception
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-        with pytest.raises(SystemExit):
-            write_config(
-                mock_ansible_module,
-                "/boot/loader/entries/linux-cachyos.conf",
-                "content",
-            )
-
-    def test_main_function_full_execution(self, mocker):
-        """Test main function execution path through the full workflow"""
-        # Mock the AnsibleModule to simulate the actual main() flow
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": "quiet",
-            "text_to_remove": None,
-            "detect_only": False,
-            "check_args": None,
-            "bootloader": "systemd-boot",
-            "config_file": None,
-        }
-        mock_module.check_mode = False
-        mock_module.exit_json = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        # Mock all the functions that are called in main
-        mocker.patch("bootloader_mod.AnsibleModule", return_value=mock_module)
-        mocker.patch("bootloader_mod.detect_bootloader", return_value="systemd-boot")
-        mocker.patch(
-            "bootloader_mod.get_bootloader_config",
-            return_value="/boot/loader/entries/linux-cachyos.conf",
-        )
-        mocker.patch(
-            "bootloader_mod.modify_config", return_value=(True, "Configuration updated")
-        )
-
-        # Import and call main function
-        from bootloader_mod import main
-
-        main()  # This will call exit_json
-
-        # Verify exit_json was called with the expected values
-        mock_module.exit_json.assert_called_once()
-        call_args = mock_module.exit_json.call_args[1]
-        assert call_args["changed"] is True
-
-    def test_main_function_detect_only_mode(self, mocker):
-        """Test main function in detect-only mode"""
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": None,
-            "text_to_remove": None,
-            "detect_only": True,
-            "check_args": None,
-            "bootloader": "auto",
-            "config_file": None,
-        }
-        # Need to make exit_json raise SystemExit to simulate real Ansible behavior
-        mock_module.exit_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock the functions that get called
-        mocker.patch("bootloader_mod.AnsibleModule", return_value=mock_module)
-        mocker.patch("bootloader_mod.detect_bootloader", return_value="systemd-boot")
-        mocker.patch(
-            "bootloader_mod.get_bootloader_config",
-            return_value="/boot/loader/entries/linux-cachyos.conf",
-        )
-
-        from bootloader_mod import main
-
-        # This should exit after the first exit_json call
-        with pytest.raises(SystemExit):
-            main()
-
-        # Verify exit_json was called with detect-only results exactly once
-        mock_module.exit_json.assert_called_once()
-        call_args = mock_module.exit_json.call_args[1]
-        assert call_args["changed"] is False
-        assert call_args["bootloader_type"] == "systemd-boot"
-
-    def test_main_function_no_supported_bootloader(self, mocker):
-        """Test main function when no supported bootloader is detected"""
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": "test",
-            "text_to_remove": None,
-            "detect_only": False,
-            "check_args": None,
-            "bootloader": "auto",
-            "config_file": None,
-        }
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock to return "none" for no bootloader
-        mocker.patch("bootloader_mod.AnsibleModule", return_value=mock_module)
-        mocker.patch("bootloader_mod.detect_bootloader", return_value="none")
-
-        from bootloader_mod import main
-
-        # This should call fail_json and exit
-        with pytest.raises(SystemExit):
-            main()
-
-        mock_module.fail_json.assert_called_once_with(
-            msg="No supported bootloader detected (systemd-boot, refind, or grub)"
-        )
-
-    def test_main_function_check_args_mode(self, mocker, temp_config_file):
-        """Test main function in check_args mode"""
-        # Write test content to the temp file
-        with open(temp_config_file, "w") as f:
-            f.write(
-                "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi\noptions root=PARTUUID=12345 ro quiet"
-            )
-
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": None,
-            "text_to_remove": None,
-            "detect_only": False,
-            "check_args": "quiet",
-            "bootloader": "systemd-boot",
-            "config_file": temp_config_file,
-        }
-        # Need to make exit_json raise SystemExit to simulate real Ansible behavior
-        mock_module.exit_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock the functions that get called
-        mocker.patch("bootloader_mod.AnsibleModule", return_value=mock_module)
-        mocker.patch(
-            "bootloader_mod.get_bootloader_config", return_value=temp_config_file
-        )
-        # Mock check_kernel_args_exist to return True
-        mocker.patch("bootloader_mod.check_kernel_args_exist", return_value=True)
-
-        from bootloader_mod import main
-
-        # This should exit after the check_args exit_json call
-        with pytest.raises(SystemExit):
-            main()
-
-        # Verify exit_json was called with check-args results exactly once
-        mock_module.exit_json.assert_called_once()
-        call_args = mock_module.exit_json.call_args[1]
-        assert call_args["args_exist"] is True
-        assert call_args["changed"] is False
-
-    def test_modify_config_with_unsupported_bootloader(self, mocker):
-        """Test modify_config with unsupported bootloader type"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        from bootloader_mod import modify_config
-
-        with pytest.raises(SystemExit):
-            modify_config(
-                mock_module, "unsupported_type", text_to_add="test", text_to_remove=None
-            )
-
-        # Verify fail_json was called with the appropriate error message
-        mock_module.fail_json.assert_called_once()
-        call_args = mock_module.fail_json.call_args[1]
-        # The actual message can be either "Could not determine config file path" or "Unsupported bootloader type"
-        # depending on which check happens first
-        msg = call_args["msg"]
-        assert (
-            "Could not determine config file path" in msg
-            or "Unsupported bootloader type" in msg
-        )
-
-    def test_modify_refind_config_edge_case_with_no_matching_lines(self, mocker):
-        """Test modify_refind_config when there are no matching lines to modify"""
-        # Content with comments and non-matching lines only
-        content = "# This is a comment\n# Another comment\nsome_other_line 123"
-        new_content, needs_change = modify_refind_config(content, "newparam", None)
-        # Should return the same content since no matching lines were found
-        assert new_content == content
-        assert needs_change is False
-
     def test_get_bootloader_config_with_none_type(self):
         """Test get_bootloader_config with None bootloader type"""
-        from bootloader_mod import get_bootloader_config
 
         result = get_bootloader_config("grub", None)  # Use valid string instead of None
         assert result is not None  # Should return default path for grub
 
-    def test_modify_config_with_backup_file_already_exists(
-        self, mocker, temp_config_file
-    ):
-        """Test modify_config when backup file already exists"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Create actual files
-        with open(temp_config_file, "w") as f:
-            f.write("test config content")
-
-        # Create backup file
-        with open(temp_config_file + ".bak", "w") as f:
-            f.write("backup content")
-
-        # Mock os.path.exists to return True for both files
-        def mock_exists(path):
-            return path in [temp_config_file, temp_config_file + ".bak"]
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=mock_exists)
-
-        from bootloader_mod import modify_config
-
-        with pytest.raises(SystemExit):
-            modify_config(
-                mock_module,
-                "systemd-boot",
-                text_to_add="test",
-                text_to_remove=None,
-                config_file=temp_config_file,
-            )
-
-        mock_module.fail_json.assert_called_once()
-
     def test_check_kernel_args_exist_with_unsupported_bootloader(self, mocker):
         """Test check_kernel_args_exist with unsupported bootloader type"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        from bootloader_mod import check_kernel_args_exist
+        mock_module = fake_module()
 
         result = check_kernel_args_exist(
             mock_module, "unsupported_type", "test_arg", "/fake/path"
@@ -1528,76 +1203,59 @@ class TestCommonOperations:
     def test_detect_bootloader_with_stopiteration(self, mocker):
         """Test detect_bootloader function when mock runs out of values"""
 
-        # Mock os.path.exists to raise StopIteration on the limine check
-        def side_effect_func(path):
-            if path == "/etc/default/limine":
-                raise StopIteration()
-            return False  # All other paths don't exist
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=side_effect_func)
-
-        from bootloader_mod import detect_bootloader
+        # Probes run in detection order; the last one (limine) raises
+        mocker.patch.object(
+            _OS_PATH, "exists", side_effect=[False, False, False, StopIteration()]
+        )
 
         # This should handle the exception gracefully and return "none"
         result = detect_bootloader()
         assert result == "none"
 
-    def test_modify_config_with_write_failure_and_backup_available(
-        self, mocker, temp_config_file
-    ):
-        """Test modify_config when write_config fails but backup file is available to restore"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
+    def test_modify_config_reports_write_failure(self, mocker, temp_config_file):
+        """Test modify_config returns the write failure after backing up"""
+        mock_module = fake_module()
+        mock_module.fail_json = FailJson()
 
         # Create actual config file
         with open(temp_config_file, "w") as f:
             f.write("original config")
 
-        # Set up mocks
-        mocker.patch(
-            "bootloader_mod.os.path.exists", return_value=True
-        )  # Config file exists, backup doesn't initially
-        mocker.patch("bootloader_mod.create_backup", return_value=True)
-        mocker.patch(
-            "bootloader_mod.write_config",
-            return_value=(False, "Failed to write config file"),
+        # The real config exists and has no backup yet, so modify_config gets
+        # as far as the write step
+        patched = mocker.patch.multiple(
+            bootloader_mod, create_backup=mocker.DEFAULT, write_config=mocker.DEFAULT
         )
+        patched["create_backup"].return_value = True
+        patched["write_config"].return_value = False
 
-        from bootloader_mod import modify_config
-
-        # Try to modify config - should fail at write step
-        with pytest.raises(SystemExit):
-            modify_config(
-                mock_module,
-                "systemd-boot",
-                text_to_add="test",
-                text_to_remove=None,
-                config_file=temp_config_file,
-            )
+        changed, message = modify_config(
+            mock_module,
+            "systemd-boot",
+            text_to_add="test",
+            text_to_remove=None,
+            config_file=temp_config_file,
+        )
 
-        mock_module.fail_json.assert_called_once()
+        assert (changed, message) == (False, "Failed to write config file")
+        assert mock_module.fail_json.calls == []
 
     def test_create_backup_exception_handling_in_modify_config(
         self, mocker, temp_config_file
     ):
         """Test modify_config when create_backup raises an exception"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
+        mock_module = fake_module()
+        mock_module.fail_json = FailJson()
 
         # Create actual config file
         with open(temp_config_file, "w") as f:
             f.write("original config")
 
-        # Mock create_backup to raise an exception
+        # Make the copy inside the real create_backup fail
         mocker.patch(
-            "bootloader_mod.os.path.exists", return_value=True
-        )  # Config file exists, backup doesn't initially
-        mocker.patch(
-            "bootloader_mod.create_backup", side_effect=Exception("Backup failed")
+            "bootloader_mod.shutil.copy2", side_effect=OSError("Backup failed")
         )
 
-        from bootloader_mod import modify_config
-
         # Try to modify config - should fail at backup step
         with pytest.raises(SystemExit):
             modify_config(
@@ -1608,146 +1266,47 @@ class TestCommonOperations:
                 config_file=temp_config_file,
             )
 
-        mock_module.fail_json.assert_called_once()
-
-    def test_modify_grub_config_complex_scenarios(self):
-        """Test modify_grub_config with complex scenarios to hit nested functions"""
-        # Test adding to an empty GRUB_CMDLINE_LINUX
-        content = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX=""\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash"'
-        new_content, needs_change = modify_grub_config(
-            content, "intel_pstate=enable", None
-        )
-        assert "intel_pstate=enable" in new_content
-
-        # Test removing from GRUB_CMDLINE_LINUX_DEFAULT
-        content = 'GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash mitigations=auto"'
-        new_content, needs_change = modify_grub_config(
-            content, None, "mitigations=auto"
-        )
-        assert "mitigations=auto" not in new_content
-        assert needs_change is True
-
-    def test_modify_config_with_missing_config_file(self, mocker):
-        """Test modify_config when config file doesn't exist"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock os.path.exists to return False
-        mocker.patch("bootloader_mod.os.path.exists", return_value=False)
-
-        from bootloader_mod import modify_config
-
-        with pytest.raises(SystemExit):
-            modify_config(
-                mock_module,
-                "grub",
-                text_to_add="test",
-                text_to_remove=None,
-                config_file="/nonexistent/file",
-            )
-
-        mock_module.fail_json.assert_called_once()
+        assert mock_module.fail_json.calls == [
+            {"msg": "Failed to create backup: Backup failed"}
+        ]
 
-    def test_check_kernel_args_exist_limine_specific(self, mocker, temp_config_file):
-        """Test check_kernel_args_exist with Limine bootloader specifically"""
-        mock_module = mocker.Mock()
+    def test_modify_config_with_missing_config_file(self, tmp_path):
+        """A missing config surfaces from the read as a 'does not exist' failure"""
+        mock_module = fake_module()
+        config = str(tmp_path / "grub")
 
-        # Create a limine config file with some kernel args
-        with open(temp_config_file, "w") as f:
-            f.write(
-                'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash mitigations=auto"\n'
-            )
-
-        # Mock os.path.exists to say the file exists
-        def mock_exists(path):
-            return path == temp_config_file
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=mock_exists)
-
-        from bootloader_mod import check_kernel_args_exist
-
-        # Test that it finds existing arg
-        result = check_kernel_args_exist(
-            mock_module, "limine", "quiet", temp_config_file
+        changed, message = modify_config(
+            mock_module,
+            "grub",
+            text_to_add="test",
+            text_to_remove=None,
+            config_file=config,
         )
-        assert result is True
 
-        # Test that it doesn't find non-existent arg
-        result = check_kernel_args_exist(
-            mock_module, "limine", "nonexistent_arg", temp_config_file
+        assert (changed, message) == (False, f"Config file {config} does not exist")
+        mock_module.fail_json.assert_called_once_with(
+            msg=f"Config file {config} does not exist"
         )
-        assert result is False
 
 
 class TestAdditionalCoverage:
     """Additional tests to cover previously uncovered lines"""
 
-    def test_safe_path_exists_stopiteration(self, mocker):
-        """Test safe_path_exists handling StopIteration - covers line 30"""
-        # Mock os.path.exists to raise StopIteration
-        mock_exists = mocker.Mock()
-        mock_exists.side_effect = StopIteration()
-        mocker.patch("bootloader_mod.os.path.exists", mock_exists)
-
-        from bootloader_mod import safe_path_exists
-
-        result = safe_path_exists("/some/path")
-        assert result is False
-
     def test_detect_bootloader_all_paths_missing(self, mocker):
         """Test detect_bootloader when no paths exist - covers line 58"""
         mocker.patch("bootloader_mod.safe_path_exists", return_value=False)
 
-        from bootloader_mod import detect_bootloader
-
         result = detect_bootloader()
         assert result == "none"
 
     def test_get_bootloader_config_none_type(self):
         """Test get_bootloader_config with None type - covers line 78"""
-        from bootloader_mod import get_bootloader_config
 
         result = get_bootloader_config("grub", None)  # Use valid string instead of None
         assert result is not None  # Should return default path for grub
 
-    def test_create_backup_exception_path(self, mocker):
-        """Test create_backup exception handling path - covers lines 131-151"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock shutil.copy2 to raise an exception
-        mocker.patch(
-            "bootloader_mod.shutil.copy2", side_effect=Exception("Permission denied")
-        )
-
-        from bootloader_mod import create_backup
-
-        with pytest.raises(SystemExit):
-            create_backup(mock_module, "/nonexistent/path")
-
-        mock_module.fail_json.assert_called_once()
-
-    def test_write_config_with_backup_exception(self, mocker):
-        """Test write_config where IOError occurs and backup restoration fails - covers line 227"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        # Mock builtins.open to raise IOError
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-        # Mock shutil.move to also raise an exception when restoring backup
-        mocker.patch("bootloader_mod.shutil.move", side_effect=Exception("Move failed"))
-
-        from bootloader_mod import write_config
-
-        with pytest.raises(SystemExit):
-            write_config(mock_module, "/test/config", "content", "/test/config.bak")
-
-        mock_module.fail_json.assert_called_once()
-
     def test_add_or_remove_parameter_edge_cases(self):
         """Test _add_or_remove_parameter edge cases - covers lines 289-299"""
-        from bootloader_mod import _add_or_remove_parameter
 
         # Test with empty param
         content, changed = _add_or_remove_parameter("test content", "", "add")
@@ -1766,242 +1325,89 @@ class TestAdditionalCoverage:
         assert content == "test content"
         assert not changed
 
-        # Test removing with word boundaries to avoid partial matches
+        # Test removing whole tokens only, never partial matches
         content, changed = _add_or_remove_parameter(
             "test_content test another_test", "test", "remove"
         )
-        # The regex should match "test" as a whole word, so it will be removed
-        # resulting in "test_content  another_test" (with extra spaces that get normalized)
-        assert "test_content" in content  # Should not remove partial matches
-        assert "another_test" in content  # Should not remove partial matches
+        assert content == "test_content another_test"
         assert changed is True  # "test" was removed, so change happened
 
-    def test_modify_systemd_boot_config_add_new_options_line(self):
-        """Test modify_systemd_boot_config adding new options line - covers line 324"""
-        from bootloader_mod import modify_systemd_boot_config
-
-        content = (
-            "title Arch Linux\nlinux /vmlinuz-linux\nefi /EFI/Linux/arch-stable.efi"
-        )
-        new_content, needs_change = modify_systemd_boot_config(content, "quiet", None)
-        assert "options quiet" in new_content
-        assert needs_change is True
-
-    def test_modify_refind_config_first_match_logic(self):
-        """Test modify_refind_config first match processing logic - covers line 347"""
-        from bootloader_mod import modify_refind_config
-
-        content = '"Boot 1" "param1 param2"\n"Boot 2" "param3 param4"'
-        new_content, needs_change = modify_refind_config(content, "newparam", "param1")
-
-        # The function processes first matching line and doesn't add to subsequent lines
-        # Check that the change happened
-        assert needs_change is True
-        # Check that param1 was removed and newparam was added
-        assert "param1" not in new_content or new_content.count(
-            "param1"
-        ) < content.count("param1")
-        assert "newparam" in new_content
-
-    def test_modify_grub_config_add_new_cmdline(self):
-        """Test modify_grub_config adding new command line - covers lines 399-401"""
-        from bootloader_mod import modify_grub_config
-
-        content = "GRUB_DEFAULT=0\nGRUB_TIMEOUT=5"  # No existing GRUB_CMDLINE
-        new_content, needs_change = modify_grub_config(content, "newparam", None)
-        assert "newparam" in new_content
-        assert needs_change is True
-
-    def test_modify_limine_config_complex_operations(self):
-        """Test modify_limine_config complex operations - covers lines 442-457"""
-        from bootloader_mod import modify_limine_config
-
-        # Test adding to existing line
-        content = 'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash"'
-        new_content, needs_change = modify_limine_config(
-            content, "intel_pstate=enable", None
-        )
-        assert "intel_pstate=enable" in new_content
-        assert needs_change is True
-
-        # Test removing from existing line
-        content = 'TIMEOUT=5\nKERNEL_CMDLINE[default]+="quiet splash mitigations=auto"'
-        new_content, needs_change = modify_limine_config(
-            content, None, "mitigations=auto"
+        # Multi-word parameters are removed as a contiguous run of tokens
+        content, changed = _add_or_remove_parameter(
+            "ro console=tty0   console=ttyS0 quiet",
+            "console=tty0 console=ttyS0",
+            "remove",
         )
-        assert "mitigations=auto" not in new_content
-        assert needs_change is True
-
-        # Test adding to line that doesn't exist initially
-        content = "TIMEOUT=5"
-        new_content, needs_change = modify_limine_config(content, "newparam", None)
-        assert "newparam" in new_content
-        assert needs_change is True
-
-    def test_modify_config_backup_exists_error(self, mocker):
-        """Test modify_config when backup file already exists - covers line 485"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        from bootloader_mod import modify_config
+        assert content == "ro quiet"
+        assert changed is True
 
-        mocker.patch(
-            "bootloader_mod.os.path.exists", side_effect=lambda x: x.endswith(".bak")
+        # A run whose tokens are not adjacent is left alone
+        content, changed = _add_or_remove_parameter(
+            "console=tty0 quiet console=ttyS0",
+            "console=tty0 console=ttyS0",
+            "remove",
         )
-        with pytest.raises(SystemExit):
-            modify_config(mock_module, "systemd-boot", "test", None, "/test/config")
-        mock_module.fail_json.assert_called_once()
-
-    def test_modify_config_file_read_error(self, mocker):
-        """Test modify_config when config file can't be read - covers lines 510-511"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        from bootloader_mod import modify_config
-
-        def exists_side_effect(path):
-            return not path.endswith(".bak")
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-        changed, message = modify_config(mock_module, "systemd-boot", "test", None)
-        assert changed is False
-        assert "Failed to read config file" in message
+        assert content == "console=tty0 quiet console=ttyS0"
+        assert not changed
 
-    def test_modify_config_unsupported_bootloader_type(self, mocker):
+    def test_modify_config_unsupported_bootloader_type(self, mocker, tmp_path):
         """Test modify_config with unsupported bootloader - covers line 518"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        from bootloader_mod import modify_config
-
-        # Mock get_bootloader_config to return a path, so we get past the first check
-        mocker.patch("bootloader_mod.get_bootloader_config", return_value="/fake/path")
+        mock_module = fake_module()
+        config = tmp_path / "fake.conf"
+        config.write_text("fake content")
 
-        # Mock os.path.exists to return True for config, False for backup
-        def exists_side_effect(path):
-            return not path.endswith(".bak")
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-        # Mock open to work
-        mocker.patch("builtins.open", mocker.mock_open(read_data="fake content"))
+        # Return a real path so we get past the config lookup check
+        mocker.patch("bootloader_mod.get_bootloader_config", return_value=str(config))
 
         changed, message = modify_config(mock_module, "unsupported", "test", None)
         assert changed is False
         assert "Unsupported bootloader type" in message
 
-    def test_modify_config_check_mode_handling(self, mocker):
+    def test_modify_config_check_mode_handling(self, mocker, tmp_path):
         """Test modify_config check_mode handling - covers lines 524, 527"""
-        mock_module = mocker.Mock()
+        mock_module = fake_module()
         mock_module.check_mode = True
-
-        from bootloader_mod import modify_config
-
-        # Mock os.path.exists to return True for main file but False for backup
-        def exists_side_effect(path):
-            # Simulate a temp path that does not exist as backup
-            return not path.endswith(".bak")
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-        mocker.patch("bootloader_mod.create_backup", return_value=True)
-        mocker.patch(
-            "builtins.open",
-            mocker.mock_open(read_data="title Arch Linux\nlinux /vmlinuz-linux"),
-        )
+        config = tmp_path / "linux-cachyos.conf"
+        config.write_text("title Arch Linux\nlinux /vmlinuz-linux")
+        mock_backup = mocker.patch("bootloader_mod.create_backup")
 
         changed, message = modify_config(
-            mock_module, "systemd-boot", "quiet", None, "/fake/path"
+            mock_module, "systemd-boot", "quiet", None, str(config)
         )
         assert changed is True  # Would change in non-check mode
         assert "Would update" in message
+        mock_backup.assert_not_called()
 
-    def test_modify_config_grub_update_path(self, mocker):
+    def test_modify_config_grub_update_path(self, mocker, tmp_path):
         """Test modify_config GRUB functionality"""
-        mock_module = mocker.Mock()
-        mock_module.run_command.return_value = (
-            0,
-            "",
-            "",
-        )  # Mock the run_command for create_backup/write_config
-        mock_module.check_mode = False  # Ensure not in check mode
-
-        from bootloader_mod import modify_config
-
-        # Mock os.path.exists to return True for main file but False for backup
-        def exists_side_effect(path):
-            return not path.endswith(".bak")
-
-        mocker.patch("bootloader_mod.os.path.exists", side_effect=exists_side_effect)
-        mocker.patch("bootloader_mod.create_backup", return_value=True)
-        mocker.patch("bootloader_mod.write_config", return_value=True)
-        # Use content that doesn't already have the parameter to ensure a change is needed
-        mock_file = mocker.mock_open(
-            read_data='GRUB_DEFAULT=0\nGRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="splash"'
-        )
-        mocker.patch("builtins.open", mock_file)
+        mock_module = fake_module()
+        # _READ_DATA doesn't already have the parameter, so a change is needed
+        config = tmp_path / "grub"
+        config.write_text(_READ_DATA)
 
         # Test modifying GRUB config with new parameter
         changed, message = modify_config(
-            mock_module, "grub", "quiet", None, "/boot/grub/grub.cfg"
+            mock_module, "grub", "quiet", None, str(config)
         )
         assert changed is True
+        assert message == f"Updated grub configuration at {config}"
 
     def test_check_kernel_args_exist_file_error(self, mocker):
         """Test check_kernel_args_exist with file read error - covers lines 553-555"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        from bootloader_mod import check_kernel_args_exist
+        mock_module = fake_module()
 
-        mocker.patch("bootloader_mod.os.path.exists", return_value=True)
-        mocker.patch("builtins.open", side_effect=IOError("Permission denied"))
-
-        result = check_kernel_args_exist(
-            mock_module, "systemd-boot", "test", "/test/path"
+        mocker.patch(
+            "bootloader_mod._read_file", side_effect=IOError("Permission denied")
         )
-        assert result is False
-        mock_module.fail_json.assert_called_once()
-
-    def test_check_kernel_args_exist_unsupported_bootloader_error(self, mocker):
-        """Test check_kernel_args_exist with unsupported bootloader - covers lines 586-587"""
-        mock_module = mocker.Mock()
-        mock_module.fail_json = mocker.Mock()
-
-        from bootloader_mod import check_kernel_args_exist
 
         result = check_kernel_args_exist(
-            mock_module, "unsupported", "test", "/test/path"
+            mock_module, "systemd-boot", "test", "/test/path"
         )
         assert result is False
         mock_module.fail_json.assert_called_once()
 
-    def test_main_function_no_bootloader_detected(self, mocker):
-        """Test main function when no bootloader is detected - covers line 659"""
-        mock_module = mocker.Mock()
-        mock_module.params = {
-            "text_to_add": "test",
-            "text_to_remove": None,
-            "detect_only": False,
-            "check_args": None,
-            "bootloader": "auto",  # This will trigger detect_bootloader
-            "config_file": None,
-        }
-        mock_module.fail_json = mocker.Mock(side_effect=SystemExit)
-
-        from bootloader_mod import main
-
-        mocker.patch("bootloader_mod.AnsibleModule", return_value=mock_module)
-        mocker.patch("bootloader_mod.detect_bootloader", return_value="none")
-        with pytest.raises(SystemExit):
-            main()
-        mock_module.fail_json.assert_called_once_with(
-            msg="No supported bootloader detected (systemd-boot, refind, or grub)"
-        )
-
     def test_update_quoted_line_params_function(self):
         """Test _update_quoted_line_params helper function"""
-        from bootloader_mod import _update_quoted_line_params
 
         # Test adding a parameter to quoted content
         line, changed = _update_quoted_line_params(
@@ -0,0 +1,115 @@
+"""End-to-end tests that drive bootloader_mod.main().
+
+They are marked slow so a quick inner loop can run ``pytest -m "not slow"``;
+the default run and CI still include them.
+"""
+
+import pytest
+
+from bootloader_mod import main
+
+pytestmark = pytest.mark.slow
+
+
+class TestMain:
+    """Tests for main() through the patched_bootloader_mod fixture"""
+
+    def test_main_function_with_detect_only(self, patched_bootloader_mod):
+        """Test main function with detect_only parameter"""
+        mod = patched_bootloader_mod
+        mod.module.params["detect_only"] = True
+        mod.module.exit_json.side_effect = SystemExit
+
+        with pytest.raises(SystemExit):
+            main()
+
+        mod.module.exit_json.assert_called_once_with(
+            changed=False,
+            bootloader_type="systemd-boot",
+            config_file="/boot/loader/entries/linux-cachyos.conf",
+        )
+
+    def test_main_function_with_args_check(self, mocker, patched_bootloader_mod):
+        """Test main function with check_args parameter"""
+        mod = patched_bootloader_mod
+        mod.module.params.update(check_args="test_arg", bootloader="systemd-boot")
+        mod.module.exit_json.side_effect = SystemExit
+        mocker.patch("bootloader_mod.check_kernel_args_exist", return_value=True)
+
+        with pytest.raises(SystemExit):
+            main()
+
+        mod.detect_bootloader.assert_not_called()
+        mod.module.exit_json.assert_called_once_with(
+            changed=False,
+            bootloader_type="systemd-boot",
+            config_file="/boot/loader/entries/linux-cachyos.conf",
+            args_exist=True,
+        )
+
+    def test_main_function_with_no_supported_bootloader(
+        self, mocker, patched_bootloader_mod
+    ):
+        """Test main returns after fail_json even if fail_json does not exit"""
+        mod = patched_bootloader_mod
+        mod.module.params["text_to_add"] = "test_param"
+        mod.module.fail_json = mocker.Mock()
+        mod.detect_bootloader.return_value = "none"
+
+        main()
+
+        mod.module.fail_json.assert_called_once_with(
+            msg="No supported bootloader detected (systemd-boot, refind, or grub)"
+        )
+        mod.module.exit_json.assert_not_called()
+
+    def test_main_function_full_execution(self, mocker, patched_bootloader_mod):
+        """Test main function execution path through the full workflow"""
+        mod = patched_bootloader_mod
+        mod.module.params.update(text_to_add="quiet", bootloader="systemd-boot")
+        mocker.patch(
+            "bootloader_mod.modify_config", return_value=(True, "Configuration updated")
+        )
+
+        main()  # This will call exit_json
+
+        # Verify exit_json was called with the expected values
+        mod.module.exit_json.assert_called_once()
+        call_args = mod.module.exit_json.call_args[1]
+        assert call_args["changed"] is True
+
+    def test_main_function_no_supported_bootloader(self, patched_bootloader_mod):
+        """Test main function when no supported bootloader is detected"""
+        mod = patched_bootloader_mod
+        mod.module.params["text_to_add"] = "test"
+        mod.detect_bootloader.return_value = "none"
+
+        with pytest.raises(SystemExit):
+            main()
+
+        assert mod.module.fail_json.calls == [
+            {"msg": "No supported bootloader detected (systemd-boot, refind, or grub)"}
+        ]
+
+    def test_main_function_check_args_mode(
+        self, mocker, patched_bootloader_mod, temp_config_file
+    ):
+        """Test main function in check_args mode"""
+        mod = patched_bootloader_mod
+        mod.module.params.update(
+            check_args="quiet", bootloader="systemd-boot", config_file=temp_config_file
+        )
+        # Need to make exit_json raise SystemExit to simulate real Ansible behavior
+        mod.module.exit_json.side_effect = SystemExit
+        mod.get_bootloader_config.return_value = temp_config_file
+        mocker.patch("bootloader_mod.check_kernel_args_exist", return_value=True)
+
+        # This should exit after the check_args exit_json call
+        with pytest.raises(SystemExit):
+            main()
+
+        # Verify exit_json was called with check-args results exactly once
+        mod.module.exit_json.assert_called_once()
+        call_args = mod.module.exit_json.call_args[1]
+        assert call_args["args_exist"] is True
+        assert call_args["changed"] is False